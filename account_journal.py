@@ -0,0 +1,195 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class AccountJournal:
+    """Append-only record log for VirtualAccount with periodic snapshot compaction.
+
+    Each state change is written as one JSON line to the current journal segment
+    (``<snapshot>.journal.<n>``). fsync is done in groups: at most every
+    ``fsync_interval`` seconds or every ``fsync_batch`` records, whichever comes
+    first. Once ``compact_every`` records have accumulated, the segment is rotated
+    and a full snapshot is written in the background; segments fully covered by
+    the snapshot are then deleted.
+    """
+
+    def __init__(self, snapshot_path='virtual_account.json', fsync_interval=0.05,
+                 fsync_batch=64, compact_every=1000):
+        self.snapshot_path = Path(snapshot_path)
+        self.fsync_interval = fsync_interval
+        self.fsync_batch = fsync_batch
+        self.compact_every = compact_every
+        self.seq = 0
+        self.records_since_snapshot = 0
+        self._segment = 0
+        self._file = None
+        self._unsynced = 0
+        self._lock = threading.Lock()
+        self._dirty = threading.Event()
+        self._flusher = None
+        self._compactor = None
+        self._closed = False
+
+    def _segment_path(self, segment):
+        return self.snapshot_path.with_name(f"{self.snapshot_path.name}.journal.{segment}")
+
+    def _segments(self):
+        prefix = f"{self.snapshot_path.name}.journal."
+        segments = []
+        for path in self.snapshot_path.parent.glob(prefix + '*'):
+            suffix = path.name[len(prefix):]
+            if suffix.isdigit():
+                segments.append(int(suffix))
+        return sorted(segments)
+
+    def load(self):
+        """Return (snapshot, records) where records are the journal tail after the snapshot"""
+        snapshot = None
+        snapshot_seq = 0
+        if self.snapshot_path.exists():
+            with open(self.snapshot_path, 'r') as f:
+                snapshot = json.load(f)
+            snapshot_seq = snapshot.get('seq', 0)
+
+        records = []
+        self.seq = snapshot_seq
+        segments = self._segments()
+        for segment in segments:
+            with open(self._segment_path(segment), 'r') as f:
+                for line_no, line in enumerate(f, 1):
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A torn final write from a crash; everything before it is intact
+                        logger.error(f"Skipping unreadable journal line {line_no} in segment {segment}")
+                        continue
+                    if record['seq'] > snapshot_seq:
+                        records.append(record)
+                        self.seq = max(self.seq, record['seq'])
+
+        self.records_since_snapshot = len(records)
+        self._segment = segments[-1] + 1 if segments else 0
+        return snapshot, records
+
+    def changes(self):
+        """Records written by other processes since the last read; a file journal has a single writer"""
+        return None, []
+
+    @contextmanager
+    def transaction(self):
+        yield self.changes()
+
+    def append(self, records):
+        """Assign sequence numbers to records and append them to the journal"""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('Journal is closed')
+            if self._file is None:
+                self._file = open(self._segment_path(self._segment), 'a')
+            lines = []
+            for record in records:
+                self.seq += 1
+                record['seq'] = self.seq
+                lines.append(json.dumps(record, separators=(',', ':')))
+            self._file.write('\n'.join(lines) + '\n')
+            self._file.flush()
+            self._unsynced += len(records)
+            self.records_since_snapshot += len(records)
+            if self._unsynced >= self.fsync_batch:
+                self._fsync()
+            else:
+                self._dirty.set()
+        self._ensure_flusher()
+        return records
+
+    def _fsync(self):
+        if self._file is not None and self._unsynced:
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+        self._dirty.clear()
+
+    def flush(self):
+        with self._lock:
+            self._fsync()
+
+    def _ensure_flusher(self):
+        if self._flusher is None or not self._flusher.is_alive():
+            self._flusher = threading.Thread(target=self._flush_loop, name='journal-flusher', daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._dirty.wait()
+            if self._closed:
+                break
+            time.sleep(self.fsync_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error syncing journal: {str(e)}")
+
+    def close(self):
+        """Sync and close the current segment and stop the flusher; nothing can be appended afterwards"""
+        if self._compactor is not None and self._compactor.is_alive():
+            self._compactor.join()
+        with self._lock:
+            self._fsync()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._closed = True
+        self._dirty.set()  # wake the flusher so it exits
+
+    def needs_compaction(self):
+        return (self.records_since_snapshot >= self.compact_every
+                and (self._compactor is None or not self._compactor.is_alive()))
+
+    def compact(self, state, background=True):
+        """Rotate the journal and persist ``state`` as the new snapshot.
+
+        ``state`` must be a copy taken at the current sequence number, or a
+        function returning one, which runs on the compaction thread; the caller
+        is responsible for holding off new appends while it is captured.
+        """
+        if self._compactor is not None and self._compactor.is_alive():
+            self._compactor.join()
+        with self._lock:
+            self._fsync()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            covered_segment = self._segment
+            self._segment += 1
+            seq = self.seq
+            self.records_since_snapshot = 0
+
+        if not background:
+            self._write_snapshot(state, seq, covered_segment)
+            return
+        self._compactor = threading.Thread(
+            target=self._write_snapshot, args=(state, seq, covered_segment),
+            name='journal-compactor', daemon=True)
+        self._compactor.start()
+
+    def _write_snapshot(self, state, seq, covered_segment):
+        try:
+            state = dict(state() if callable(state) else state, seq=seq)
+            tmp_path = self.snapshot_path.with_name(f"{self.snapshot_path.name}.{os.getpid()}.tmp")
+            with open(tmp_path, 'w') as f:
+                json.dump(state, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+            for segment in self._segments():
+                if segment <= covered_segment:
+                    self._segment_path(segment).unlink()
+            logger.info(f"Compacted account journal at seq {state['seq']}")
+        except Exception as e:
+            logger.error(f"Error compacting journal: {str(e)}")
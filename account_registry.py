@@ -0,0 +1,112 @@
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class AccountRegistry:
+    """Accounts keyed by user id, loaded on first use and kept in an LRU cache.
+
+    At most ``capacity`` accounts stay loaded; beyond that the least recently
+    used ones are closed and dropped. Accounts for which ``pinned(account)`` is
+    true (resting orders that the ticker still has to match) are never evicted,
+    and neither are accounts a request holds through ``using``; those are
+    evicted once released. Each user loads at most once at a time, so two
+    requests can't open the same state files twice.
+    """
+
+    def __init__(self, factory, capacity=256, pinned=None):
+        self.factory = factory
+        self.capacity = capacity
+        self.pinned = pinned or (lambda account: False)
+        self._accounts = OrderedDict()  # user id -> account, least recently used first
+        self._loading = {}  # user id -> Event set once the load finishes
+        self._in_use = {}  # user id -> number of requests holding the account
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._accounts)
+
+    def __contains__(self, user_id):
+        return user_id in self._accounts
+
+    def items(self):
+        with self._lock:
+            return list(self._accounts.items())
+
+    def get(self, user_id):
+        while True:
+            with self._lock:
+                account = self._accounts.get(user_id)
+                if account is not None:
+                    self._accounts.move_to_end(user_id)
+                    metrics.CACHE_REQUESTS.inc('accounts', 'hit')
+                    return account
+                loading = self._loading.get(user_id)
+                if loading is None:
+                    metrics.CACHE_REQUESTS.inc('accounts', 'miss')
+                    loading = self._loading[user_id] = threading.Event()
+                    break
+            # Another request is loading this user; use its result (or retry if it failed)
+            loading.wait()
+
+        evicted = []
+        try:
+            account = self.factory(user_id)
+            with self._lock:
+                self._accounts[user_id] = account
+                evicted = self._evict()
+        finally:
+            with self._lock:
+                del self._loading[user_id]
+            loading.set()
+
+        self._close(evicted)
+        return account
+
+    @contextmanager
+    def using(self, user_id):
+        """The user's account, kept loaded until the block exits"""
+        with self._lock:
+            self._in_use[user_id] = self._in_use.get(user_id, 0) + 1
+        try:
+            yield self.get(user_id)
+        finally:
+            with self._lock:
+                self._in_use[user_id] -= 1
+                if not self._in_use[user_id]:
+                    del self._in_use[user_id]
+                # Evictions skipped while it was held
+                evicted = self._evict()
+            self._close(evicted)
+
+    def _close(self, evicted):
+        for evicted_id, evicted_account, closing in evicted:
+            try:
+                evicted_account.close()
+            except Exception as e:
+                logger.error(f"Error closing account {evicted_id}: {str(e)}")
+            finally:
+                with self._lock:
+                    del self._loading[evicted_id]
+                closing.set()
+
+    def _evict(self):
+        """Drop least recently used accounts over capacity; callers must close them.
+
+        Until an evicted account is closed, loading it again waits, so its last
+        writes are on disk before a new instance reads them.
+        """
+        evicted = []
+        for user_id in list(self._accounts):
+            if len(self._accounts) <= self.capacity:
+                break
+            account = self._accounts[user_id]
+            if not self.pinned(account) and user_id not in self._loading and user_id not in self._in_use:
+                closing = self._loading[user_id] = threading.Event()
+                evicted.append((user_id, self._accounts.pop(user_id), closing))
+        return evicted
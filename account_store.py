@@ -0,0 +1,187 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from account_journal import AccountJournal
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteJournal:
+    """AccountJournal backed by SQLite in WAL mode, shared by every worker process.
+
+    Records live in one table keyed by ``seq`` and the latest snapshot in
+    another. Writers take SQLite's write lock with ``BEGIN IMMEDIATE``, read
+    whatever other workers committed since their last read, and only then
+    validate and append, so concurrent workers never act on stale balances.
+    Readers call ``changes()``, which costs one ``PRAGMA data_version`` when
+    nothing has changed.
+    """
+
+    def __init__(self, db_path='virtual_account.db', import_path=None, compact_every=1000, busy_timeout=30):
+        self.db_path = Path(db_path)
+        self.import_path = Path(import_path) if import_path else None
+        self.compact_every = compact_every
+        self.busy_timeout = busy_timeout
+        self.seq = 0
+        self.records_since_snapshot = 0
+        self._conn = None
+        self._pid = None
+        self._data_version = None
+        self._in_transaction = False
+        self._closed = False
+        self._lock = threading.RLock()
+
+    def _connection(self):
+        if self._closed:
+            raise RuntimeError('Journal is closed')
+        # Connections must not cross a fork, so each worker opens its own
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(str(self.db_path), timeout=self.busy_timeout,
+                                   isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS records (seq INTEGER PRIMARY KEY, record TEXT NOT NULL)')
+            conn.execute('CREATE TABLE IF NOT EXISTS snapshot '
+                         '(id INTEGER PRIMARY KEY CHECK (id = 1), seq INTEGER NOT NULL, state TEXT NOT NULL)')
+            self._conn, self._pid = conn, os.getpid()
+            self._import_legacy()
+        return self._conn
+
+    def _import_legacy(self):
+        """Seed an empty database from the JSON snapshot and journal written by AccountJournal"""
+        if self.import_path is None or not self.import_path.exists():
+            return
+        self._conn.execute('BEGIN IMMEDIATE')
+        try:
+            empty = (self._conn.execute('SELECT COUNT(*) FROM snapshot').fetchone()[0] == 0
+                     and self._conn.execute('SELECT COUNT(*) FROM records').fetchone()[0] == 0)
+            if empty:
+                snapshot, records = AccountJournal(self.import_path).load()
+                if snapshot is not None:
+                    self._conn.execute('INSERT INTO snapshot (id, seq, state) VALUES (1, ?, ?)',
+                                       (snapshot.get('seq', 0), json.dumps(snapshot)))
+                self._conn.executemany('INSERT INTO records (seq, record) VALUES (?, ?)',
+                                       [(record['seq'], json.dumps(record)) for record in records])
+                logger.info(f"Imported {self.import_path} into {self.db_path}")
+            self._conn.execute('COMMIT')
+        except Exception:
+            self._conn.execute('ROLLBACK')
+            raise
+
+    def load(self):
+        """Return (snapshot, records) where records are everything committed after the snapshot"""
+        with self._lock:
+            conn = self._connection()
+            # Read before the data so a commit landing in between is picked up by the next changes()
+            self._data_version = conn.execute('PRAGMA data_version').fetchone()[0]
+            if not self._in_transaction:
+                conn.execute('BEGIN')
+            try:
+                row = conn.execute('SELECT seq, state FROM snapshot WHERE id = 1').fetchone()
+                snapshot = json.loads(row[1]) if row else None
+                snapshot_seq = row[0] if row else 0
+                records = self._records_after(snapshot_seq)
+            finally:
+                if not self._in_transaction:
+                    conn.execute('COMMIT')
+            self.seq = records[-1]['seq'] if records else snapshot_seq
+            self.records_since_snapshot = len(records)
+            return snapshot, records
+
+    def _records_after(self, seq):
+        rows = self._conn.execute('SELECT record FROM records WHERE seq > ? ORDER BY seq', (seq,))
+        return [json.loads(row[0]) for row in rows]
+
+    def changes(self):
+        """(snapshot, records) committed by other connections since the last read.
+
+        snapshot is None unless this worker fell behind a compaction, in which
+        case the caller has to rebuild its state from it.
+        """
+        with self._lock:
+            conn = self._connection()
+            data_version = conn.execute('PRAGMA data_version').fetchone()[0]
+            if data_version == self._data_version and not self._in_transaction:
+                return None, []
+            self._data_version = data_version
+            records = self._records_after(self.seq)
+            if records and records[0]['seq'] != self.seq + 1:
+                return self.load()
+            if not records:
+                row = conn.execute('SELECT seq FROM snapshot WHERE id = 1').fetchone()
+                if row and row[0] > self.seq:
+                    return self.load()
+            if records:
+                self.seq = records[-1]['seq']
+                self.records_since_snapshot += len(records)
+            return None, records
+
+    @contextmanager
+    def transaction(self):
+        """Hold the database write lock; yields the changes() other workers made before it was taken"""
+        with self._lock:
+            conn = self._connection()
+            conn.execute('BEGIN IMMEDIATE')
+            self._in_transaction = True
+            try:
+                yield self.changes()
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            finally:
+                self._in_transaction = False
+
+    def append(self, records):
+        """Assign sequence numbers to records and insert them; commits with the enclosing transaction"""
+        with self._lock:
+            if not self._in_transaction:
+                with self.transaction():
+                    return self.append(records)
+            rows = []
+            for record in records:
+                self.seq += 1
+                record['seq'] = self.seq
+                rows.append((self.seq, json.dumps(record, separators=(',', ':'))))
+            self._conn.executemany('INSERT INTO records (seq, record) VALUES (?, ?)', rows)
+            self.records_since_snapshot += len(records)
+            return records
+
+    def flush(self):
+        """Commits are already durable; kept for AccountJournal compatibility"""
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+            self._closed = True
+
+    def needs_compaction(self):
+        return self.records_since_snapshot >= self.compact_every
+
+    def compact(self, state, background=True):
+        """Store ``state`` as the snapshot at the current seq and drop the records it covers.
+
+        ``state`` may be a function returning it, as for AccountJournal. Runs
+        inline: it is a single write in the current transaction, so
+        ``background`` is accepted only for AccountJournal compatibility.
+        """
+        with self._lock:
+            if not self._in_transaction:
+                with self.transaction():
+                    return self.compact(state, background)
+            state = dict(state() if callable(state) else state, seq=self.seq)
+            self._conn.execute(
+                'INSERT INTO snapshot (id, seq, state) VALUES (1, ?, ?) '
+                'ON CONFLICT(id) DO UPDATE SET seq = excluded.seq, state = excluded.state '
+                'WHERE excluded.seq > snapshot.seq',
+                (self.seq, json.dumps(state)))
+            self._conn.execute('DELETE FROM records WHERE seq <= ?', (self.seq,))
+            self.records_since_snapshot = 0
+            logger.info(f"Compacted account store at seq {self.seq}")
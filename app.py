@@ -1,21 +1,55 @@
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, render_template, jsonify, request, g
 from flask_cors import CORS
-import requests
+from flask_socketio import SocketIO, join_room
 import time
 from datetime import datetime
 import threading
-import json
 from pathlib import Path
 import os
 import logging
+import re
+from types import MappingProxyType
+from contextlib import ExitStack, contextmanager
+from bisect import bisect_right
 
 # auth_routes.py
 from flask import Blueprint, request, jsonify
 from supabase_client import supabase
-from functools import wraps
+from account_journal import AccountJournal
+from account_store import SQLiteJournal
+from account_registry import AccountRegistry
+from order_book import OrderBook
+from price_history import PriceHistory, RESOLUTIONS
+from indicators import VolatilityTracker
+from grid_strategy import GridStrategy
+from price_sources import PriceAggregator, sources_from_config
+from fill_model import DepthCache, DepthFills
+from scheduler import StrategyScheduler
+from market_feed import FeedRecorder, FeedReplay
+import ledger
+from ledger import Order, Trade, RESTING, market_precision
+from token_verifier import TokenVerifier
+import backtest
+import optimizer
+import montecarlo
+import metrics
+from functools import partial, wraps
 
 
 auth_bp = Blueprint('auth', __name__)
+
+def _remote_user_id(token):
+    with metrics.upstream('supabase', 'get_user'):
+        return supabase.auth.get_user(token).user.id
+
+# Tokens are checked locally against the project's JWT secret; without one every check goes to Supabase
+token_verifier = TokenVerifier(
+    secret=os.environ.get('SUPABASE_JWT_SECRET'),
+    cache_size=int(os.environ.get('AUTH_TOKEN_CACHE_SIZE', 1024)),
+    remote=_remote_user_id,
+    remote_fallback=os.environ.get('SUPABASE_AUTH_REMOTE_FALLBACK', '').lower() in ('1', 'true', 'yes')
+)
+
 def require_auth(f):
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -25,10 +59,10 @@ def require_auth(f):
         
         token = auth_header.split(' ')[1]
         try:
-            user = supabase.auth.get_user(token)
-            return f(user.user.id, *args, **kwargs)
+            user_id = token_verifier.verify(token)
         except Exception as e:
             return jsonify({'error': 'Invalid token'}), 401
+        return f(user_id, *args, **kwargs)
             
     return decorated
 
@@ -42,10 +76,11 @@ def login():
         if not email or not password:
             return jsonify({'error': 'Email and password required'}), 400
             
-        response = supabase.auth.sign_in_with_password({
-            "email": email,
-            "password": password
-        })
+        with metrics.upstream('supabase', 'sign_in'):
+            response = supabase.auth.sign_in_with_password({
+                "email": email,
+                "password": password
+            })
         
         return jsonify({
             'access_token': response.session.access_token,
@@ -67,10 +102,11 @@ def signup():
         if not email or not password:
             return jsonify({'error': 'Email and password required'}), 400
             
-        response = supabase.auth.sign_up({
-            "email": email,
-            "password": password
-        })
+        with metrics.upstream('supabase', 'sign_up'):
+            response = supabase.auth.sign_up({
+                "email": email,
+                "password": password
+            })
         
         return jsonify({
             'access_token': response.session.access_token,
@@ -90,240 +126,379 @@ logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 CORS(app) 
+socketio = SocketIO(app, cors_allowed_origins='*', async_mode='threading')
+
+# Exposed at /metrics; each worker process keeps its own
+REQUEST_SECONDS = metrics.REGISTRY.histogram(
+    'gridbot_http_request_seconds', 'HTTP request latency by route', ('method', 'route', 'status'))
+ACCOUNT_SECONDS = metrics.REGISTRY.histogram(
+    'gridbot_account_operation_seconds', 'Time spent in VirtualAccount operations', ('operation',))
+ORDERS = metrics.REGISTRY.counter('gridbot_orders_total', 'Orders placed', ('market', 'side', 'type'))
+FILLS = metrics.REGISTRY.counter('gridbot_fills_total', 'Trades from filled orders', ('market', 'side'))
+CANCELS = metrics.REGISTRY.counter('gridbot_cancels_total', 'Orders cancelled', ('market',))
 
 class VirtualAccount:
-    def __init__(self, initial_balance=1000):
+    def __init__(self, initial_balance=1000, state_path=None, journal=None):
         self.initial_usdt = initial_balance
         self.reset_balance()
         self.orders = []
         self.trades = []
+        self._reset_indexes()
+        self.positions = {}  # per-market running position, cost basis, realized PnL and win counts
+        self._positions_from = 0  # index of the first trade since the last reset, which the positions cover
+        self._orders_by_id = {}
+        self._books = {}  # market -> OrderBook of open orders
+        self.strategies = {}  # market -> GridStrategy re-centering that market's grid
+        self._depth = {}  # market -> DepthFills this account is taking from (FILL_MODEL=depth)
         self.initial_portfolio_value = initial_balance
         self.realized_pnl_applied = set()  # Track which trades' PnL has been applied
+        state_path = state_path or os.environ.get('ACCOUNT_STATE_PATH', 'virtual_account.json')
+        if journal is not None:
+            self.journal = journal
+        elif os.environ.get('ACCOUNT_DB_PATH'):
+            # Shared by every worker process; the JSON state is imported the first time
+            self.journal = SQLiteJournal(os.environ['ACCOUNT_DB_PATH'], import_path=state_path)
+        else:
+            self.journal = AccountJournal(state_path)
+        self._lock = threading.RLock()  # the ticker thread fills orders while requests place and cancel them
+        self._listeners = []
         self._load_state()
 
-    def place_order(self, market, side, price, quantity):
-        base_asset = market.replace('USDT', '')
-        
-        order_id = f"order_{int(time.time() * 1000)}_{len(self.orders)}"
-        
-        # Calculate entry price for the trade
-        entry_price = self._calculate_average_entry_price() if side == 'sell' else price
-        order = {
-        'id': order_id,
-        'market': market,
-        'side': side,
-        'price': float(price),
-        'quantity': float(quantity),
-        'status': 'OPEN',  # Make sure this is set
-        'timestamp': datetime.now().isoformat()
-         }
-        try:
-            # Check if we have enough balance
-            if side == 'buy':
-                cost = float(price) * float(quantity)
-                if self.balances['USDT'] < cost:
-                    logger.error(f"Insufficient USDT balance. Required: {cost}, Available: {self.balances['USDT']}")
-                    return {'error': 'Insufficient USDT balance'}
-                self.balances['USDT'] -= cost
-                self.balances[base_asset] += float(quantity)
-            else:  # sell
-                if self.balances[base_asset] < float(quantity):
-                    logger.error(f"Insufficient {base_asset} balance. Required: {quantity}, Available: {self.balances[base_asset]}")
-                    return {'error': f'Insufficient {base_asset} balance'}
-                
-                # Calculate and apply realized PnL for sell orders
-                if entry_price:
-                    realized_pnl = float(quantity) * (float(price) - entry_price)
-                    self.balances['USDT'] += float(price) * float(quantity)  # Add the sell proceeds
-                    logger.info(f"Realized PnL for trade: {realized_pnl}")
-                
-                self.balances[base_asset] -= float(quantity)
-
-            # Record the trade
-            trade = {
-                'order_id': order_id,
-                'market': market,
-                'side': side,
-                'price': float(price),
-                'quantity': float(quantity),
-                'entry_price': entry_price,
-                'timestamp': datetime.now().isoformat(),
-                'value': float(price) * float(quantity)
-            }
-            
-            if side == 'sell':
-                trade['realized_pnl'] = realized_pnl
-
-            self.orders.append(order)
-            self.trades.append(trade)
-            self._save_state()
-            
-            logger.info(f"Order placed successfully: {order_id}")
-            return {'id': order_id, 'status': 'SUCCESS'}
-
-        except Exception as e:
-            logger.error(f"Error placing order: {str(e)}")
-            return {'error': str(e)}    
     def reset_balance(self):
+        # Balances are integer ticks of each asset (see ledger.py); get_balances() converts them
         self.balances = {
-            'USDT': self.initial_usdt,
+            'USDT': ledger.to_ticks(self.initial_usdt, 'USDT'),
             'OM': 0,
             'ETH': 0,
             'BNB': 0,
             'XRP': 0,
             'SOL': 0
         }
-        logger.info(f"Balance reset to: {self.balances}")
+        logger.info(f"Balance reset to: {self.get_balances()}")
+
+    def get_balances(self):
+        return ledger.balances_from_ticks(self.balances)
 
+    @metrics.timed(ACCOUNT_SECONDS, 'load_state')
     def _load_state(self):
         try:
-            if Path('virtual_account.json').exists():
-                with open('virtual_account.json', 'r') as f:
-                    data = json.load(f)
-                    self.balances = data.get('balances', self.balances)
-                    self.orders = data.get('orders', [])
-                    self.trades = data.get('trades', [])
+            self._restore(*self.journal.load())
         except Exception as e:
             logger.error(f"Error loading state: {str(e)}")
 
-    def _save_state(self):
-        try:
-            with open('virtual_account.json', 'w') as f:
-                json.dump({
-                    'balances': self.balances,
-                    'orders': self.orders,
-                    'trades': self.trades
-                }, f)
-        except Exception as e:
-            logger.error(f"Error saving state: {str(e)}")
-    def calculate_pnl(self):
-        try:
-            current_price = market_data.get_market_price('OMUSDT')
-            if not current_price:
-                logger.error("Could not fetch current market price")
-                return {
-                    'total_pnl': 0,
-                    'total_pnl_percent': 0,
-                    'realized_pnl': 0,
-                    'realized_pnl_percent': 0,
-                    'unrealized_pnl': 0,
-                    'unrealized_pnl_percent': 0,
-                    'total_trades': len(self.trades),
-                    'win_rate': 0
-                }
-            
-            # Calculate realized PnL from completed trades
-            realized_pnl = sum(
-                trade.get('realized_pnl', 0) 
-                for trade in self.trades 
-                if trade['side'] == 'sell'
-            )
-            
-            # Calculate unrealized PnL
-            average_entry_price = self._calculate_average_entry_price()
-            unrealized_pnl = self.balances['OM'] * (current_price - average_entry_price)
-            
-            # Calculate total PnL
-            total_pnl = realized_pnl + unrealized_pnl
-            
-            # Calculate percentages
-            realized_pnl_percent = (realized_pnl / self.initial_portfolio_value) * 100 if self.initial_portfolio_value != 0 else 0
-            unrealized_pnl_percent = (unrealized_pnl / self.initial_portfolio_value) * 100 if self.initial_portfolio_value != 0 else 0
-            total_pnl_percent = (total_pnl / self.initial_portfolio_value) * 100 if self.initial_portfolio_value != 0 else 0
-            
-            # Calculate win rate
-            sell_trades = [t for t in self.trades if t['side'] == 'sell']
-            profitable_trades = sum(1 for t in sell_trades if t.get('realized_pnl', 0) > 0)
-            win_rate = (profitable_trades / len(sell_trades) * 100) if sell_trades else 0
-            
-            return {
-                'total_pnl': total_pnl,
-                'total_pnl_percent': total_pnl_percent,
-                'realized_pnl': realized_pnl,
-                'realized_pnl_percent': realized_pnl_percent,
-                'unrealized_pnl': unrealized_pnl,
-                'unrealized_pnl_percent': unrealized_pnl_percent,
-                'total_trades': len(self.trades),
-                'win_rate': win_rate
-            }
-                
-        except Exception as e:
-            logger.error(f"Error calculating PnL: {str(e)}")
+    def _restore(self, snapshot, records):
+        """Rebuild the in-memory state from a snapshot and the records committed after it"""
+        with self._lock:
+            self.orders, self.trades, self.positions = [], [], {}
+            self._positions_from = 0
+            self._reset_indexes()
+            self._orders_by_id, self._books, self.strategies = {}, {}, {}
+            self.reset_balance()
+            if snapshot:
+                if 'balances' in snapshot:
+                    self.balances.update(ledger.balances_to_ticks(snapshot['balances']))
+                # Before version 2 every order filled as soon as it was placed but stayed 'OPEN'
+                legacy = snapshot.get('version', 1) < 2
+                for order in snapshot.get('orders', []):
+                    order = Order.from_dict(order)
+                    if legacy and order.status == 'OPEN':
+                        order.status = 'FILLED'
+                    self._add_order(order)
+                # Replaying the trades rebuilds the per-market accumulators; a reset started them over
+                positions_from = snapshot.get('positions_from', 0)
+                for index, trade in enumerate(snapshot.get('trades', [])):
+                    if index == positions_from:
+                        self.positions = {}
+                    self._apply_trade(Trade.from_dict(trade))
+                self._positions_from = positions_from
+                for strategy in snapshot.get('strategies', []):
+                    self.strategies[strategy['market']] = GridStrategy.from_dict(strategy)
+            for record in records:
+                self._apply_record(ledger.decode_record(record))
+
+    def _reset_indexes(self):
+        # Account version at which each trade was added and each order changed, in insertion order,
+        # so paging and deltas are a bisect instead of a scan of the whole history
+        self._trade_versions, self._trade_times = [], []
+        self._order_log_versions, self._order_log_ids = [], []
+
+    def close(self):
+        """Flush and release the journal once the account is no longer used"""
+        with self._lock:
+            self.journal.close()
+
+    def has_open_orders(self):
+        return any(len(book) for book in self._books.values())
+
+    def sync(self):
+        """Apply whatever other workers committed since the last read"""
+        with self._lock:
+            self._catch_up(*self.journal.changes())
+
+    def _catch_up(self, snapshot, records):
+        if snapshot is not None:
+            # Fell behind a compaction by another worker
+            self._restore(snapshot, records)
+            return
+        for record in records:
+            self._apply_record(ledger.decode_record(record))
+        if records:
+            self._notify(records)
+
+    @contextmanager
+    def _transaction(self):
+        """Hold the account lock and the store's write lock, with the state caught up to the latest commit"""
+        with self._lock:
+            applied = self.version
+            try:
+                with self.journal.transaction() as changes:
+                    self._catch_up(*changes)
+                    applied = self.version
+                    yield
+            except Exception:
+                if self.version != applied:
+                    # Records applied in memory were rolled back by the store
+                    self._load_state()
+                raise
+
+    def _state_copy(self):
+        return self._state_capture()()
+
+    def _state_capture(self):
+        """A function building a snapshot of the current state, cheap to take under the lock.
+
+        The journal runs it on its compaction thread. Trades and finished orders
+        never change once applied, so only references to them are kept; resting
+        orders, which fills and cancels still change, are encoded right away.
+        """
+        orders = list(self.orders)
+        trades = list(self.trades)
+        resting = {order.id: order.to_dict() for order in self._open_orders()}
+        balances = self.get_balances()
+        positions_from = self._positions_from
+        strategies = [strategy.to_dict() for strategy in self.strategies.values()]
+
+        def build():
             return {
-                'total_pnl': 0,
-                'total_pnl_percent': 0,
-                'realized_pnl': 0,
-                'realized_pnl_percent': 0,
-                'unrealized_pnl': 0,
-                'unrealized_pnl_percent': 0,
-                'total_trades': len(self.trades),
-                'win_rate': 0
+                'version': 2,
+                'balances': balances,
+                'orders': [resting.get(order.id) or order.to_dict() for order in orders],
+                'trades': [trade.to_dict() for trade in trades],
+                'positions_from': positions_from,
+                'strategies': strategies
             }
+        return build
 
-    def place_order(self, market, side, price, quantity):
-        base_asset = market.replace('USDT', '')
-        
-        order_id = f"order_{int(time.time() * 1000)}_{len(self.orders)}"
-        order = {
-            'id': order_id,
-            'market': market,
-            'side': side,
-            'price': float(price),
-            'quantity': float(quantity),
-            'status': 'OPEN',
-            'timestamp': datetime.now().isoformat()
-        }
+    @property
+    def version(self):
+        """Sequence number of the last committed record; changes whenever the account does"""
+        return self.journal.seq
 
-        try:
-            # Check if we have enough balance
-            if side == 'buy':
-                cost = float(price) * float(quantity)
-                logger.info(f"Buy order cost: {cost}, Current USDT balance: {self.balances['USDT']}")
-                if self.balances['USDT'] < cost:
-                    logger.error(f"Insufficient USDT balance. Required: {cost}, Available: {self.balances['USDT']}")
-                    return {'error': 'Insufficient USDT balance'}
-                self.balances['USDT'] -= cost
-                self.balances[base_asset] += float(quantity)
-            else:  # sell
-                logger.info(f"Sell order quantity: {quantity}, Current {base_asset} balance: {self.balances[base_asset]}")
-                if self.balances[base_asset] < float(quantity):
-                    logger.error(f"Insufficient {base_asset} balance. Required: {quantity}, Available: {self.balances[base_asset]}")
-                    return {'error': f'Insufficient {base_asset} balance'}
-                self.balances['USDT'] += float(price) * float(quantity)
-                self.balances[base_asset] -= float(quantity)
-
-            # Record the trade
-            trade = {
-                'order_id': order_id,
+    def dashboard(self, market='OMUSDT', price=None):
+        """Balances, average entry, PnL and open order count for one market from a single consistent read"""
+        with self._lock:
+            return {
+                'version': self.version,
                 'market': market,
-                'side': side,
-                'price': float(price),
-                'quantity': float(quantity),
-                'timestamp': datetime.now().isoformat(),
-                'value': float(price) * float(quantity)
+                'price': price,
+                'balances': self.get_balances(),
+                'average_entry_price': self._calculate_average_entry_price(market),
+                'pnl': self.calculate_pnl(market, price),
+                'open_orders': len(self._books.get(market, ()))
             }
 
-            self.orders.append(order)
-            self.trades.append(trade)
-            self._save_state()
-            logger.info(f"Order placed successfully: {order_id}")
-            return {'id': order_id, 'status': 'SUCCESS'}
+    def subscribe(self, callback):
+        """Call ``callback(records)`` with the records of every committed change"""
+        self._listeners.append(callback)
 
-        except Exception as e:
-            logger.error(f"Error placing order: {str(e)}")
-            return {'error': str(e)}
-    def reset_all(self):
-        """Reset everything: balance, orders, and trades"""
-        self.reset_balance()
-        self._save_state()
+    def _commit(self, records):
+        """Journal records first, then apply them, so memory never runs ahead of disk.
+
+        Records hold ledger objects and integer ticks; the journal and listeners
+        get them encoded as plain dicts with decimal amounts.
+        """
+        encoded = [ledger.encode_record(record) for record in records]
+        with ACCOUNT_SECONDS.time('journal_append'):
+            self.journal.append(encoded)
+        for record, wire in zip(records, encoded):
+            self._apply_record(record)
+            self._count(record)
+            if record['op'] == 'trade' and record['trade'].cost is not None:
+                # Listeners also get the entry price and PnL worked out when the sell was applied
+                wire['trade'] = record['trade'].to_dict()
+        if self.journal.needs_compaction():
+            # The copy and hand-off; AccountJournal writes the snapshot itself on a background thread
+            with ACCOUNT_SECONDS.time('compact'):
+                self.journal.compact(self._state_capture())
+        self._notify(encoded)
+
+    def _count(self, record):
+        op = record['op']
+        if op == 'order':
+            order = record['order']
+            ORDERS.inc(order.market, order.side, order.type)
+        elif op == 'trade':
+            FILLS.inc(record['trade'].market, record['trade'].side)
+        elif op == 'status' and record['status'] == 'CANCELLED':
+            order = self._orders_by_id.get(record['id'])
+            CANCELS.inc(order.market if order else '')
+
+    def _notify(self, records):
+        for callback in self._listeners:
+            try:
+                callback(records)
+            except Exception as e:
+                logger.error(f"Error in account listener: {str(e)}")
+
+    def _apply_record(self, record):
+        op = record['op']
+        if op == 'order':
+            self._add_order(record['order'])
+        elif op == 'trade':
+            self._apply_trade(record['trade'])
+        elif op == 'balances':
+            self.balances.update(record['balances'])
+        elif op == 'status':
+            order = self._orders_by_id.get(record['id'])
+            if order:
+                order.status = record['status']
+                self._log_order(order)
+                if 'filled' in record:
+                    order.filled = market_precision(order.market).quantity(record['filled'])
+                if record['status'] not in RESTING:
+                    self._book(order.market).remove(order.id)
+        elif op == 'reset':
+            self.balances = dict(record['balances'])
+            # Trades stay in the history, but positions and PnL start over from the new balances
+            self.positions = {}
+            self._positions_from = len(self.trades)
+        elif op == 'strategy':
+            if record['strategy']:
+                self.strategies[record['market']] = GridStrategy.from_dict(record['strategy'])
+            else:
+                self.strategies.pop(record['market'], None)
+
+    def _book(self, market):
+        book = self._books.get(market)
+        if book is None:
+            book = self._books[market] = OrderBook(market)
+        return book
+
+    def _add_order(self, order):
+        self.orders.append(order)
+        self._orders_by_id[order.id] = order
+        self._log_order(order)
+        if order.status in RESTING and order.type == 'limit':
+            self._book(order.market).add(order)
+
+    def _log_order(self, order):
+        # The journal has already advanced past the record being applied, so an order never
+        # gets a version lower than the change's; a client may see a change twice but never misses one
+        self._order_log_versions.append(self.version)
+        self._order_log_ids.append(order.id)
+
+    def get_order(self, order_id):
+        order = self._orders_by_id.get(order_id)
+        return order.to_dict() if order else None
+
+    def get_open_orders(self, market=None):
+        """Open orders sorted by price, for one market or all of them"""
+        return [order.to_dict() for order in self._open_orders(market)]
+
+    def _open_orders(self, market=None):
+        if market:
+            books = [self._books[market]] if market in self._books else []
+        else:
+            books = self._books.values()
+        return [self._orders_by_id[order_id] for book in books for order_id in book.order_ids()]
+
+    def get_trades(self):
+        return [trade.to_dict() for trade in self.trades]
+
+    def trades_page(self, after=None, after_timestamp=None, limit=100):
+        """Trades in insertion order after ``after`` (a trade's seq) or ``after_timestamp``; the latest ``limit`` without either"""
+        with self._lock:
+            if after is not None:
+                start = max(after, 0)
+            elif after_timestamp is not None:
+                start = bisect_right(self._trade_times, after_timestamp)
+            else:
+                start = max(len(self.trades) - limit, 0)
+            return self._page(self.trades, start, limit, 'trades')
+
+    def trades_since(self, version):
+        """Trades added after account ``version``"""
+        with self._lock:
+            start = bisect_right(self._trade_versions, version)
+            return self._page(self.trades, start, len(self.trades), 'trades')
+
+    def orders_page(self, after=None, limit=100):
+        """Orders of every status in the order they were placed, after ``after`` (an order's seq)"""
+        with self._lock:
+            return self._page(self.orders, max(after or 0, 0), limit, 'orders')
+
+    def orders_since(self, version, market=None):
+        """Orders placed or changed after account ``version``, each once in its current state"""
+        with self._lock:
+            start = bisect_right(self._order_log_versions, version)
+            orders = (self._orders_by_id[order_id] for order_id in dict.fromkeys(self._order_log_ids[start:]))
+            return {
+                'orders': [order.to_dict() for order in orders if market is None or order.market == market],
+                'version': self.version
+            }
+
+    def _page(self, items, start, limit, key):
+        page = items[start:start + limit]
         return {
-            'balances': self.balances,
-            'orders': self.orders,
-            'trades': self.trades
+            key: [dict(item.to_dict(), seq=start + i + 1) for i, item in enumerate(page)],
+            'next': start + len(page),  # pass as ``after`` for the following page
+            'version': self.version
         }
-   
+
+    def _position(self, market):
+        position = self.positions.get(market)
+        if position is None:
+            # quantity in the market's quantity ticks, cost basis and PnL in quote ticks
+            position = self.positions[market] = {
+                'quantity': 0,
+                'cost_basis': 0,
+                'realized_pnl': 0,
+                'sells': 0,
+                'wins': 0
+            }
+        return position
+
+    def _apply_trade(self, trade):
+        """Append a trade and fold it into its market's running position (average-cost basis)"""
+        position = self._position(trade.market)
+        if trade.side == 'buy':
+            position['quantity'] += trade.quantity
+            position['cost_basis'] += trade.value
+        else:
+            held = position['quantity']
+            # Cost of the sold quantity at the average entry; with nothing held the sale is flat
+            trade.cost = position['cost_basis'] * trade.quantity // held if held > 0 else trade.value
+            trade.realized_pnl = trade.value - trade.cost
+            position['realized_pnl'] += trade.realized_pnl
+            position['sells'] += 1
+            if trade.realized_pnl > 0:
+                position['wins'] += 1
+
+            if trade.quantity >= held:
+                # Integer ticks: a closed position leaves exactly nothing behind
+                position['quantity'] = 0
+                position['cost_basis'] = 0
+            else:
+                position['quantity'] -= trade.quantity
+                position['cost_basis'] -= trade.cost
+        self.trades.append(trade)
+        self._trade_versions.append(self.version)
+        self._trade_times.append(trade.timestamp or '')
+
+    @metrics.timed(ACCOUNT_SECONDS, 'calculate_pnl')
+    def calculate_pnl(self, market='OMUSDT', current_price=None):
         try:
-            current_price = market_data.get_market_price('OMUSDT')
+            current_price = current_price or market_data.get_market_price(market)
             if not current_price:
                 logger.error("Could not fetch current market price")
                 return {
@@ -336,63 +511,29 @@ class VirtualAccount:
                     'total_trades': len(self.trades),
                     'win_rate': 0
                 }
-                
-            # Calculate current portfolio value
-            current_portfolio_value = (
-                self.balances['USDT'] +
-                self.balances['OM'] * current_price
-            )
             
-            # Calculate total PnL
-            total_pnl = current_portfolio_value - self.initial_portfolio_value
-            total_pnl_percent = (total_pnl / self.initial_portfolio_value) * 100 if self.initial_portfolio_value != 0 else 0
-            
-            # Initialize realized PnL variables
-            realized_pnl = 0
-            entry_prices = {}
-            
-            # Calculate realized PnL from completed trades
-            for trade in self.trades:
-                if trade['side'] == 'buy':
-                    # Store entry price for the quantity bought
-                    if 'OM' not in entry_prices:
-                        entry_prices['OM'] = []
-                    entry_prices['OM'].append({
-                        'price': trade['price'],
-                        'quantity': trade['quantity']
-                    })
-                elif trade['side'] == 'sell' and entry_prices.get('OM'):
-                    # FIFO calculation for realized PnL
-                    sell_quantity = trade['quantity']
-                    sell_price = trade['price']
-                    
-                    while sell_quantity > 0 and entry_prices['OM']:
-                        entry = entry_prices['OM'][0]
-                        used_quantity = min(sell_quantity, entry['quantity'])
-                        
-                        # Calculate PnL for this portion
-                        realized_pnl += used_quantity * (sell_price - entry['price'])
-                        
-                        # Update remaining quantities
-                        sell_quantity -= used_quantity
-                        entry['quantity'] -= used_quantity
-                        
-                        # Remove entry if fully used
-                        if entry['quantity'] <= 0:
-                            entry_prices['OM'].pop(0)
+            # Realized PnL and win counts come from the running accumulators (exact integer sums)
+            realized_pnl = ledger.from_ticks(sum(position['realized_pnl'] for position in self.positions.values()), 'USDT')
+            sells = sum(position['sells'] for position in self.positions.values())
+            wins = sum(position['wins'] for position in self.positions.values())
             
             # Calculate unrealized PnL
-            average_entry_price = self._calculate_average_entry_price()
-            unrealized_pnl = self.balances['OM'] * (current_price - average_entry_price)
+            # The position, not the free balance: base reserved by resting sells is still held
+            precision = market_precision(market)
+            average_entry_price = self._calculate_average_entry_price(market)
+            held = precision.quantity_float(self.positions.get(market, {}).get('quantity', 0))
+            unrealized_pnl = held * (current_price - average_entry_price)
+            
+            # Calculate total PnL
+            total_pnl = realized_pnl + unrealized_pnl
             
             # Calculate percentages
             realized_pnl_percent = (realized_pnl / self.initial_portfolio_value) * 100 if self.initial_portfolio_value != 0 else 0
             unrealized_pnl_percent = (unrealized_pnl / self.initial_portfolio_value) * 100 if self.initial_portfolio_value != 0 else 0
+            total_pnl_percent = (total_pnl / self.initial_portfolio_value) * 100 if self.initial_portfolio_value != 0 else 0
             
             # Calculate win rate
-            sell_trades = [t for t in self.trades if t['side'] == 'sell']
-            profitable_trades = sum(1 for t in sell_trades if t['price'] > t.get('entry_price', 0))
-            win_rate = (profitable_trades / len(sell_trades) * 100) if sell_trades else 0
+            win_rate = (wins / sells * 100) if sells else 0
             
             return {
                 'total_pnl': total_pnl,
@@ -417,100 +558,471 @@ class VirtualAccount:
                 'total_trades': len(self.trades),
                 'win_rate': 0
             }
-                
-    def _calculate_average_entry_price(self):
-        """Calculate average entry price for current OM position"""
-        buy_trades = [t for t in self.trades if t['side'] == 'buy']
-        if not buy_trades:
+
+    def reset_all(self):
+        """Reset everything: balance, orders, and trades"""
+        with self._transaction():
+            self.reset_balance()
+            # Resting orders lose their reserved funds with the reset, so they are withdrawn without a refund
+            records = [{'op': 'status', 'id': order.id, 'status': 'CANCELLED'} for order in self._open_orders()]
+            records.extend({'op': 'strategy', 'market': market, 'strategy': None} for market in self.strategies)
+            records.append({'op': 'reset', 'balances': dict(self.balances)})
+            self._commit(records)
+            return {
+                'balances': self.get_balances(),
+                'orders': [order.to_dict() for order in self.orders],
+                'trades': self.get_trades()
+            }
+
+    def _calculate_average_entry_price(self, market='OMUSDT'):
+        """Calculate average entry price for the current position in a market"""
+        position = self.positions.get(market)
+        if not position or position['quantity'] <= 0:
             return 0
-            
-        total_quantity = sum(t['quantity'] for t in buy_trades)
-        total_value = sum(t['quantity'] * t['price'] for t in buy_trades)
-        
-        return total_value / total_quantity if total_quantity > 0 else 0
-        
-    def place_order(self, market, side, price, quantity):
-        base_asset = market.replace('USDT', '')
+        precision = market_precision(market)
+        return position['cost_basis'] * precision.quantity_scale / (position['quantity'] * ledger.QUOTE_SCALE)
         
-        order_id = f"order_{int(time.time() * 1000)}_{len(self.orders)}"
-        order = {
-            'id': order_id,
+    @metrics.timed(ACCOUNT_SECONDS, 'place_order')
+    def place_order(self, market, side, price, quantity, order_type='market'):
+        result = self.place_orders([{
             'market': market,
             'side': side,
-            'price': float(price),
-            'quantity': float(quantity),
-            'status': 'OPEN',
-            'timestamp': datetime.now().isoformat()
-        }
+            'price': price,
+            'quantity': quantity,
+            'type': order_type
+        }])
+        if 'error' in result:
+            return {'error': result['error']}
+        logger.info(f"Order placed successfully: {result['orders'][0]['id']}")
+        return result['orders'][0]
+
+    @metrics.timed(ACCOUNT_SECONDS, 'place_orders')
+    def place_orders(self, batch):
+        """Place a batch of orders atomically: balances are checked across the whole
+        batch first, then everything is applied and persisted in a single commit.
 
+        Market orders fill immediately at their price, or with the depth fill
+        model at the volume-weighted price of the book levels they take, partly
+        if the book is too thin. Limit orders reserve their funds and rest in
+        the book until a ticker crosses them; when filled, an order with a
+        ``counter_price`` places the opposite order at that price.
+        """
         try:
-            # Check if we have enough balance
-            if side == 'buy':
-                cost = float(price) * float(quantity)
-                logger.info(f"Buy order cost: {cost}, Current USDT balance: {self.balances['USDT']}")
-                if self.balances['USDT'] < cost:
-                    logger.error(f"Insufficient USDT balance. Required: {cost}, Available: {self.balances['USDT']}")
-                    return {'error': 'Insufficient USDT balance'}
-                self.balances['USDT'] -= cost
-                self.balances[base_asset] += float(quantity)
-            else:  # sell
-                logger.info(f"Sell order quantity: {quantity}, Current {base_asset} balance: {self.balances[base_asset]}")
-                if self.balances[base_asset] < float(quantity):
-                    logger.error(f"Insufficient {base_asset} balance. Required: {quantity}, Available: {self.balances[base_asset]}")
-                    return {'error': f'Insufficient {base_asset} balance'}
-                self.balances['USDT'] += float(price) * float(quantity)
-                self.balances[base_asset] -= float(quantity)
-
-            # Record the trade
-            trade = {
-                'order_id': order_id,
-                'market': market,
-                'side': side,
-                'price': float(price),
-                'quantity': float(quantity),
-                'timestamp': datetime.now().isoformat(),
-                'value': float(price) * float(quantity)
-            }
+            if not batch:
+                return {'error': 'No orders provided'}
 
-            self.orders.append(order)
-            self.trades.append(trade)
-            self._save_state()
-            logger.info(f"Order placed successfully: {order_id}")
-            return {'id': order_id, 'status': 'SUCCESS'}
+            fills = self._depth_fills({spec['market'] for spec in batch if spec.get('type', 'market') == 'market'})
+            with self._transaction():
+                balances = {}  # running balances for the assets this batch touches
+                records = []
+                results = []
+                drafts = self._depth_drafts(fills)
+                error = self._order_records(batch, balances, records, results, drafts)
+                if error:
+                    return error
+                records.append({'op': 'balances', 'balances': balances})
+                self._commit(records)
+                self._take_depth(fills, drafts)
+            return {'status': 'SUCCESS', 'orders': results}
 
+        except (KeyError, TypeError, ValueError) as e:
+            logger.error(f"Invalid order in batch: {str(e)}")
+            return {'error': f'Invalid order: {str(e)}'}
         except Exception as e:
-            logger.error(f"Error placing order: {str(e)}")
+            logger.error(f"Error placing orders: {str(e)}")
             return {'error': str(e)}
 
+    def _order_records(self, batch, balances, records, results, fills=None):
+        """Validate a batch against running balances and append its records; returns an error or None.
+
+        ``fills`` maps markets to the DepthFills their market orders fill against.
+        """
+        order_ms = int(time.time() * 1000)
+        for index, spec in enumerate(batch):
+            market = spec['market']
+            side = spec['side']
+            order_type = spec.get('type', 'market')
+            # Prices and quantities are rounded to the market's ticks; everything below is exact
+            precision = market_precision(market)
+            price = precision.price(spec['price'])
+            quantity = precision.quantity(spec['quantity'])
+            base_asset = precision.base_asset
+
+            if side not in ('buy', 'sell'):
+                return {'error': f"Invalid side: {side}", 'index': index}
+            if order_type not in ('market', 'limit'):
+                return {'error': f"Invalid order type: {order_type}", 'index': index}
+            if price <= 0 or quantity <= 0:
+                return {'error': 'Price and quantity must be positive', 'index': index}
+            if base_asset not in self.balances:
+                return {'error': f'Unsupported market: {market}', 'index': index}
+
+            fill_quantity, fill_price = quantity, price
+            if order_type == 'market' and fills and market in fills:
+                fill_quantity, fill_price = fills[market].take(side, quantity)
+                if not fill_quantity:
+                    return {'error': f'No {market} liquidity to fill the order', 'index': index}
+
+            usdt = balances.get('USDT', self.balances['USDT'])
+            base = balances.get(base_asset, self.balances[base_asset])
+            value = precision.value(fill_price, fill_quantity)
+            if side == 'buy':
+                if usdt < value:
+                    logger.error(f"Insufficient USDT balance. Required: {ledger.from_ticks(value, 'USDT')}, "
+                                 f"Available: {ledger.from_ticks(usdt, 'USDT')}")
+                    return {'error': 'Insufficient USDT balance', 'index': index}
+                balances['USDT'] = usdt - value
+            else:  # sell
+                if base < quantity:
+                    logger.error(f"Insufficient {base_asset} balance. Required: {precision.quantity_float(quantity)}, "
+                                 f"Available: {precision.quantity_float(base)}")
+                    return {'error': f'Insufficient {base_asset} balance', 'index': index}
+                balances[base_asset] = base - fill_quantity
+
+            order_id = f"order_{order_ms}_{len(self.orders) + len(results)}"
+            order = Order(order_id, market, side, order_type, price, quantity, 'OPEN', datetime.now().isoformat(),
+                          precision.price(spec['counter_price']) if spec.get('counter_price') else None)
+
+            if order_type == 'market':
+                if fill_quantity < quantity:
+                    # Nothing rests or was reserved for the rest of a market order; it expires unfilled
+                    order.status, order.filled = 'EXPIRED', fill_quantity
+                else:
+                    order.status = 'FILLED'
+                records.append({'op': 'order', 'order': order})
+                records.append({'op': 'trade', 'trade': self._fill(order, balances, fill_quantity, fill_price)})
+            else:
+                records.append({'op': 'order', 'order': order})
+            results.append({'id': order_id, 'status': 'SUCCESS'})
+        return None
+
+    def _fill(self, order, balances, quantity=None, price=None):
+        """Credit the proceeds of a fill (by default all of the order at its price) to the running balances and return its trade"""
+        quantity = order.quantity if quantity is None else quantity
+        price = order.price if price is None else price
+        trade = Trade(order.id, order.market, order.side, price, quantity, datetime.now().isoformat())
+        precision = market_precision(order.market)
+        if order.side == 'buy':
+            balances[precision.base_asset] = balances.get(precision.base_asset, self.balances[precision.base_asset]) + quantity
+            if order.type == 'limit' and price != order.price:
+                # The order reserved funds at its own price; filling below it refunds the difference
+                balances['USDT'] = (balances.get('USDT', self.balances['USDT'])
+                                    + precision.value(order.price, quantity) - trade.value)
+        else:
+            balances['USDT'] = balances.get('USDT', self.balances['USDT']) + trade.value
+        return trade
+
+    def _depth_fills(self, markets):
+        """DepthFills for each market when FILL_MODEL=depth; markets without usable depth fill at their price.
+
+        Each account keeps taking from the same DepthFills until the cached book
+        is refreshed, so liquidity it already took isn't filled again.
+        """
+        fills = {}
+        if depth_cache is not None:
+            for market in markets:
+                book = depth_cache.get(market)
+                if not book:
+                    continue
+                current = self._depth.get(market)
+                if current is None or current.book is not book:
+                    current = self._depth[market] = DepthFills(book)
+                fills[market] = current
+        return fills
+
+    @staticmethod
+    def _depth_drafts(fills):
+        """Copies of ``fills`` for a batch to take from; the liquidity is only gone once ``_take_depth`` keeps them"""
+        return {market: depth.draft() for market, depth in fills.items()}
+
+    @staticmethod
+    def _take_depth(fills, drafts):
+        for market, draft in drafts.items():
+            fills[market].apply(draft)
+
+    def active_markets(self):
+        """Markets with resting orders or a trailing grid, i.e. the ones ticks have work for"""
+        with self._lock:
+            return {market for market, book in self._books.items() if len(book)} | set(self.strategies)
+
+    def on_price(self, market, price):
+        """Fill the market's orders ``price`` crosses and re-center its trailing grid if price left the band"""
+        if len(self._book(market)):
+            self.match_orders(market, price)
+        strategy = self.strategies.get(market)
+        # Two comparisons per tick; the grid is only touched once price leaves the trail
+        if strategy and strategy.shift_for(market_precision(market).price(price)):
+            self.recenter_grid(market, price)
+
+    def set_strategy(self, market, strategy):
+        """Start (or with None, stop) re-centering ``market``'s grid"""
+        with self._transaction():
+            self._commit([{'op': 'strategy', 'market': market, 'strategy': strategy.to_dict() if strategy else None}])
+
+    def recenter_grid(self, market, price):
+        """Shift the market's grid onto ``price``, cancelling and placing only the levels that change.
+
+        Runs as one commit. New sell levels that the freed inventory can't cover
+        are bought at market, as when the grid was started.
+        """
+        fills = self._depth_fills([market])
+        with self._transaction():
+            strategy = self.strategies.get(market)
+            precision = market_precision(market)
+            price_ticks = precision.price(price)
+            # Another worker may have re-centered already
+            shift = strategy.shift_for(price_ticks) if strategy else 0
+            if not shift:
+                return None
+            strategy = GridStrategy.from_dict(strategy.to_dict())
+            cancel, place = strategy.recenter(shift, price_ticks, self._open_orders(market))
+
+            balances = {}
+            records = []
+            for order_id in cancel:
+                self._cancel_records(self._orders_by_id[order_id], balances, records)
+            base_asset = precision.base_asset
+            shortfall = (sum(precision.quantity(spec['quantity']) for spec in place if spec['side'] == 'sell')
+                         - balances.get(base_asset, self.balances[base_asset]))
+            if shortfall > 0:
+                place.insert(0, {'market': market, 'side': 'buy', 'type': 'market',
+                                 'price': price, 'quantity': precision.quantity_float(shortfall)})
+            drafts = self._depth_drafts(fills)
+            error = self._order_records(place, balances, records, [], drafts)
+            if error:
+                logger.error(f"Could not re-center {market} grid: {error['error']}")
+                return error
+            records.append({'op': 'balances', 'balances': balances})
+            records.append({'op': 'strategy', 'market': market, 'strategy': strategy.to_dict()})
+            self._commit(records)
+            self._take_depth(fills, drafts)
+            logger.info(f"Re-centered {market} grid by {shift} levels at {price}: "
+                        f"cancelled {len(cancel)}, placed {len(place)} orders")
+            return {'shift': shift, 'cancelled': cancel, 'placed': len(place)}
+
+    @metrics.timed(ACCOUNT_SECONDS, 'match_orders')
+    def match_orders(self, market, price):
+        """Fill the resting orders a trade at ``price`` crosses and place their counter orders.
+
+        The book lookup is a bisect, so the cost follows the number of fills rather
+        than the number of open orders.
+        """
+        precision = market_precision(market)
+        price_ticks = precision.price(price)
+        # Cheap check on the in-memory book before taking the store's write lock
+        if not self._book(market).crossed(price_ticks):
+            return []
+        # Depth is read before the lock too; it is cached and shared by every account
+        depth = self._depth_fills([market])
+        with self._transaction():
+            order_ids = self._book(market).crossed(price_ticks)
+            if not order_ids:
+                return []
+            drafts = self._depth_drafts(depth)
+            fills = drafts.get(market)
+
+            balances = {}
+            records = []
+            counters = []
+            filled_ids = []
+            for order_id in order_ids:
+                order = self._orders_by_id[order_id]
+                remaining = order.quantity - order.filled
+                quantity, fill_price = remaining, order.price
+                if fills:
+                    # Only book levels at the order's price or better; the rest stays resting
+                    quantity, fill_price = fills.take(order.side, remaining, limit=order.price)
+                    if not quantity:
+                        continue
+                if quantity < remaining:
+                    records.append({'op': 'status', 'id': order_id, 'status': 'PARTIALLY_FILLED',
+                                    'filled': precision.quantity_float(order.filled + quantity)})
+                else:
+                    records.append({'op': 'status', 'id': order_id, 'status': 'FILLED'})
+                records.append({'op': 'trade', 'trade': self._fill(order, balances, quantity, fill_price)})
+                filled_ids.append(order_id)
+                if order.counter_price:
+                    counters.append({
+                        'market': market,
+                        'side': 'sell' if order.side == 'buy' else 'buy',
+                        'type': 'limit',
+                        'price': precision.price_float(order.counter_price),
+                        'quantity': precision.quantity_float(quantity),
+                        'counter_price': precision.price_float(order.price)
+                    })
+            if not filled_ids:
+                return []
+
+            if counters:
+                counter_balances = dict(balances)
+                counter_records = []
+                error = self._order_records(counters, counter_balances, counter_records, [])
+                if error:
+                    logger.error(f"Could not place counter orders for {market}: {error['error']}")
+                else:
+                    balances = counter_balances
+                    records.extend(counter_records)
+            records.append({'op': 'balances', 'balances': balances})
+            self._commit(records)
+            self._take_depth(depth, drafts)
+            logger.info(f"Filled {len(filled_ids)} {market} orders at {price}")
+            return filled_ids
+
+    def cancel_order(self, order_id):
+        with self._transaction():
+            return self._cancel_order(order_id)
+
+    def _cancel_order(self, order_id):
+        order = self._orders_by_id.get(order_id)
+
+        if not order:
+            return {'error': 'Order not found', 'code': 404}
+
+        # Only limit orders still in the book have funds reserved to refund
+        if order.type != 'limit' or order.status not in RESTING or order_id not in self._book(order.market):
+            return {'error': 'Order cannot be cancelled', 'code': 400}
+
+        refund = {}
+        records = []
+        self._cancel_records(order, refund, records)
+        records.append({'op': 'balances', 'balances': refund})
+        self._commit(records)
+        logger.info(f"Order {order_id} cancelled successfully")
+        return {'id': order_id, 'status': 'CANCELLED'}
+
+    def _cancel_records(self, order, balances, records):
+        """Append the records cancelling ``order``, refunding its reserved funds into running ``balances``"""
+        # If it was a buy order, refund the USDT; if it was a sell order, refund the base asset
+        precision = market_precision(order.market)
+        remaining = order.quantity - order.filled
+        if order.side == 'buy':
+            balances['USDT'] = balances.get('USDT', self.balances['USDT']) + precision.value(order.price, remaining)
+        else:
+            asset = precision.base_asset
+            balances[asset] = balances.get(asset, self.balances[asset]) + remaining
+        records.append({'op': 'status', 'id': order.id, 'status': 'CANCELLED'})
+
 class MarketData:
-    def __init__(self):
-        self.base_url = "https://api.coindcx.com"
+    def __init__(self, refresh_interval=None, aggregator=None):
+        self.base_url = os.environ.get('COINDCX_BASE_URL', "https://api.coindcx.com")
+        self.refresh_interval = float(refresh_interval if refresh_interval is not None
+                                      else os.environ.get('TICKER_REFRESH_INTERVAL', 1.0))
+        # PRICE_SOURCES lists the exchanges to combine, e.g. 'coindcx,ccxt:binance,ccxt:kucoin'
+        self.aggregator = aggregator or PriceAggregator(
+            sources_from_config(
+                os.environ.get('PRICE_SOURCES', 'coindcx'),
+                markets=list(ledger.MARKET_PRECISION),
+                coindcx_url=self.base_url,
+                coindcx_public_url=os.environ.get('COINDCX_PUBLIC_URL', 'https://public.coindcx.com'),
+                timeout=float(os.environ.get('PRICE_SOURCE_TIMEOUT', 2.0))
+            ),
+            method=os.environ.get('PRICE_AGGREGATION', 'median')
+        )
+        # (ticker snapshot keyed by market, fetch time) swapped as one tuple so readers never see a mix
+        self._state = (MappingProxyType({}), None)
+        self._refresh_lock = threading.Lock()
+        self._refresher = None
+        self._stop = threading.Event()
+        self._listeners = []
 
-    def get_market_price(self, market):
+    def start(self):
+        """Start the background thread that keeps the ticker snapshot fresh"""
+        with self._refresh_lock:
+            if self._refresher and self._refresher.is_alive():
+                return
+            self._stop.clear()
+            self._refresher = threading.Thread(target=self._run, name='ticker-refresher', daemon=True)
+            self._refresher.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def subscribe(self, callback, timed=False):
+        """Call ``callback(snapshot)`` after every successful ticker refresh; ``timed`` callbacks
+        also get the snapshot's fetch time, which is the recorded time when replaying a feed"""
+        self._listeners.append((callback, timed))
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.refresh()
+            self._stop.wait(self.refresh_interval)
+
+    def refresh(self):
+        """Fetch the tickers of every price source once and publish them as an immutable per-market index"""
         try:
-            response = requests.get(f"{self.base_url}/exchange/ticker")
-            if response.status_code == 200:
-                data = response.json()
-                for ticker in data:
-                    if ticker['market'] == market:
-                        return float(ticker['last_price'])
+            snapshot, fetched_at = self.aggregator.fetch()
+            if snapshot is None:
+                logger.error("No price source returned a ticker")
+                return False
+            if fetched_at == self._state[1]:
+                return False  # nothing newer than what is already published
+            self._state = (MappingProxyType(snapshot), fetched_at)
+            self._publish(*self._state)
+            return True
         except Exception as e:
             logger.error(f"Error fetching market price: {str(e)}")
+        return False
+
+    def _publish(self, snapshot, fetched_at):
+        for callback, timed in self._listeners:
+            try:
+                if timed:
+                    callback(snapshot, fetched_at)
+                else:
+                    callback(snapshot)
+            except Exception as e:
+                logger.error(f"Error in ticker listener {getattr(callback, '__name__', callback)}: {str(e)}")
+
+    def get_snapshot(self):
+        """Return (snapshot, fetched_at), blocking only until the very first fetch completes"""
+        if self._refresher is None:
+            self.start()
+        snapshot, fetched_at = self._state
+        if fetched_at is None:
+            with self._refresh_lock:
+                snapshot, fetched_at = self._state
+                if fetched_at is None:
+                    self.refresh()
+                    snapshot, fetched_at = self._state
+        return snapshot, fetched_at
+
+    def get_snapshot_age(self):
+        fetched_at = self.get_snapshot()[1]
+        return time.time() - fetched_at if fetched_at else None
+
+    def get_market_price(self, market):
+        ticker = self.get_snapshot()[0].get(market)
+        if ticker:
+            try:
+                return float(ticker['last_price'])
+            except (KeyError, TypeError, ValueError):
+                logger.error(f"Malformed ticker for {market}: {ticker}")
         return None
 
+    def get_market_prices(self, markets=None):
+        """Prices for several markets from one snapshot; all markets when none are given"""
+        snapshot = self.get_snapshot()[0]
+        prices = {}
+        for market in (markets if markets is not None else snapshot.keys()):
+            ticker = snapshot.get(market)
+            try:
+                prices[market] = float(ticker['last_price']) if ticker else None
+            except (KeyError, TypeError, ValueError):
+                prices[market] = None
+        return prices
+
 class GridCalculator:
     def __init__(self, total_usdt=20000):
         self.total_usdt = total_usdt
 
-    def calculate_grid_parameters(self, current_price):
+    def calculate_grid_parameters(self, current_price, grid_levels=6, band=0.003, capital_fraction=0.8):
         try:
-            grid_levels = 6
-            price_margin = current_price * 0.003
+            price_margin = current_price * band
             upper_price = current_price + price_margin
             lower_price = current_price - price_margin
             grid_spacing = (upper_price - lower_price) / (grid_levels - 1)
             
-            usable_balance = self.total_usdt * 0.8
+            usable_balance = self.total_usdt * capital_fraction
             max_quantity_per_grid = usable_balance / (grid_levels * current_price)
             
             quantity_per_grid = round(max_quantity_per_grid, 6)
@@ -531,9 +1043,285 @@ class GridCalculator:
             logger.error(f"Error calculating grid parameters: {str(e)}")
             return None
 
-virtual_account = VirtualAccount()
-market_data = MarketData()
+    def calculate_adaptive_parameters(self, current_price, volatility, atr_multiple=3.0, spacing_multiple=1.0,
+                                      min_band=0.001, max_band=0.05, min_spacing=0.0025,
+                                      min_levels=3, max_levels=20, capital_fraction=0.8):
+        """Grid sized from live volatility: band from ATR and the recent range, spacing from EWMA volatility.
+
+        Falls back to the fixed band until the indicators have enough bars.
+        min_spacing keeps each level clear of the 0.2% round-trip fee.
+        """
+        if not volatility.get('ready'):
+            params = self.calculate_grid_parameters(current_price, capital_fraction=capital_fraction)
+            if params:
+                params['volatility'] = volatility
+            return params
+        try:
+            half_width = atr_multiple * volatility['atr']
+            if volatility['range_high'] is not None:
+                # Cover where price has traded recently, if that is wider than the ATR band
+                half_width = max(half_width, (volatility['range_high'] - volatility['range_low']) / 2)
+            band = min(max(half_width / current_price, min_band), max_band)
+            spacing = max(volatility['ewma_volatility'] * spacing_multiple, min_spacing)
+            grid_levels = int(min(max(2 * band / spacing + 1, min_levels), max_levels))
+            params = self.calculate_grid_parameters(current_price, grid_levels, band, capital_fraction)
+            if params:
+                params['band'] = band
+                params['volatility'] = volatility
+            return params
+        except Exception as e:
+            logger.error(f"Error calculating adaptive grid parameters: {str(e)}")
+            return None
+
+ACCOUNTS_DIR = Path(os.environ.get('ACCOUNTS_DIR', 'accounts'))
+USER_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+# ALLOW_ANONYMOUS_ACCOUNT=true lets requests without a bearer token use one shared account
+# in ACCOUNT_STATE_PATH / ACCOUNT_DB_PATH, which anyone can trade or reset
+ALLOW_ANONYMOUS = os.environ.get('ALLOW_ANONYMOUS_ACCOUNT', 'false').lower() in ('1', 'true', 'yes')
+
+def load_account(user_id):
+    """Open a user's account from its own state partition under ACCOUNTS_DIR"""
+    if user_id is None:
+        account = VirtualAccount()
+    else:
+        if not USER_ID_PATTERN.match(user_id):
+            raise ValueError(f"Invalid user id: {user_id}")
+        ACCOUNTS_DIR.mkdir(parents=True, exist_ok=True)
+        state_path = ACCOUNTS_DIR / f"{user_id}.json"
+        if os.environ.get('ACCOUNT_DB_PATH'):
+            journal = SQLiteJournal(ACCOUNTS_DIR / f"{user_id}.db", import_path=state_path)
+        else:
+            journal = AccountJournal(state_path)
+        account = VirtualAccount(state_path=state_path, journal=journal)
+    room = account_room(user_id)
+    account.subscribe(lambda records: push_account_changes(account, room, records))
+    # Any change can start or end work on a market, so the schedule follows every commit
+    account.subscribe(lambda records: schedule_account(account, room))
+    schedule_account(account, room)
+    return account
+
+def schedule_account(account, room):
+    """Give the scheduler one tick handler per market the account is active in"""
+    scheduler.schedule(room, {market: partial(account.on_price, market) for market in account.active_markets()})
+
+def account_room(user_id):
+    return f"user:{user_id}" if user_id is not None else 'anonymous'
+
+# Accounts with resting orders or trailing grids stay loaded so the ticker keeps matching them
+accounts = AccountRegistry(
+    load_account,
+    capacity=int(os.environ.get('ACCOUNT_CACHE_SIZE', 256)),
+    pinned=lambda account: account.has_open_orders() or bool(account.strategies)
+)
+# FEED_REPLAY_PATH plays a recorded feed through the engine instead of fetching live prices,
+# FEED_REPLAY_SPEED times as fast as it was recorded ('max' for as fast as listeners keep up).
+# FEED_REPLAY_PAUSED holds it at the first frame until POST /api/market/replay
+feed_replay = None
+if os.environ.get('FEED_REPLAY_PATH'):
+    replay_speed = os.environ.get('FEED_REPLAY_SPEED', '1')
+    feed_replay = FeedReplay(os.environ['FEED_REPLAY_PATH'],
+                             speed=None if replay_speed == 'max' else float(replay_speed),
+                             paused=os.environ.get('FEED_REPLAY_PAUSED', 'false').lower() in ('1', 'true', 'yes'))
+market_data = MarketData(refresh_interval=0, aggregator=feed_replay) if feed_replay else MarketData()
+# FEED_RECORD_PATH appends every ticker refresh to a binary feed file that can be replayed later
+feed_recorder = FeedRecorder(os.environ['FEED_RECORD_PATH']) if os.environ.get('FEED_RECORD_PATH') else None
+scheduler = StrategyScheduler(max_workers=int(os.environ.get('STRATEGY_WORKERS', 8)))
+# Markets with candle history and volatility indicators; '*' keeps every market in the ticker
+tracked_markets = (
+    None if os.environ.get('PRICE_HISTORY_MARKETS') == '*'
+    else os.environ.get('PRICE_HISTORY_MARKETS', ','.join(ledger.MARKET_PRECISION)).split(',')
+)
+price_history = PriceHistory(tracked_markets)
+# ATR / EWMA volatility / rolling range over VOLATILITY_BAR_SECONDS bars, for adaptive grid sizing
+volatility = VolatilityTracker(
+    tracked_markets,
+    bar_seconds=int(os.environ.get('VOLATILITY_BAR_SECONDS', 60)),
+    atr_period=int(os.environ.get('VOLATILITY_ATR_PERIOD', 14))
+)
+# FILL_MODEL=depth fills against cached order book depth instead of at the order price
+depth_cache = (
+    DepthCache(market_data.aggregator.fetch_depth, ttl=float(os.environ.get('DEPTH_CACHE_TTL', 2.0)))
+    if os.environ.get('FILL_MODEL', 'ideal') == 'depth' else None
+)
 grid_calculator = GridCalculator(total_usdt=1000)
+# Upper bound on paths x steps per stress test request; 10k paths of a day of 1m bars is 14.4M
+STRESS_MAX_POINTS = int(os.environ.get('STRESS_MAX_POINTS', 50_000_000))
+grid_sweeps = optimizer.SweepCache(
+    objective=os.environ.get('GRID_SWEEP_OBJECTIVE', 'pnl'),
+    initial_balance=grid_calculator.total_usdt
+)
+
+# Push channel: clients get small deltas when something changes instead of polling
+_last_prices = {}
+# Socket id -> (user id, market its dashboard shows); PnL is only computed for these
+_socket_watches = {}
+_socket_watches_lock = threading.Lock()
+
+def _watches(room=None):
+    """(user id, market) pairs with a connected dashboard, for every room or just ``room``"""
+    with _socket_watches_lock:
+        watches = set(_socket_watches.values())
+    return {(user_id, market) for user_id, market in watches if room is None or account_room(user_id) == room}
+
+def push_price_changes(snapshot):
+    changed = {}
+    for market, ticker in snapshot.items():
+        price = ticker.get('last_price')
+        if _last_prices.get(market) != price:
+            _last_prices[market] = price
+            changed[market] = float(price) if price is not None else None
+    if changed:
+        socketio.emit('prices', {'prices': changed, 'time': time.time()})
+        for user_id, market in _watches():
+            if market in changed and user_id in accounts:
+                push_pnl(accounts.get(user_id), account_room(user_id), market, changed[market])
+
+def push_account_changes(account, room, records):
+    delta = {'balances': {}, 'trades': [], 'orders': []}
+    for record in records:
+        op = record['op']
+        if op in ('balances', 'reset'):
+            delta['balances'].update(record['balances'])
+        elif op == 'trade':
+            delta['trades'].append(record['trade'])
+        elif op == 'order':
+            delta['orders'].append(record['order'])
+        elif op == 'status':
+            order = {'id': record['id'], 'status': record['status']}
+            if 'filled' in record:
+                order['filled_quantity'] = record['filled']
+            delta['orders'].append(order)
+    socketio.emit('account', delta, to=room)
+    for _, market in _watches(room):
+        push_pnl(account, room, market)
+
+def push_pnl(account, room, market, price=None):
+    pnl = account.calculate_pnl(market, price)
+    pnl['market'] = market
+    pnl['average_entry_price'] = account._calculate_average_entry_price(market)
+    socketio.emit('pnl', pnl, to=room)
+
+def sync_accounts(snapshot):
+    """Pick up what other workers committed, which may add markets to an account's schedule"""
+    for user_id, account in accounts.items():
+        try:
+            account.sync()
+        except Exception as e:
+            logger.error(f"Error syncing {account_room(user_id)}: {str(e)}")
+
+def finish_ticks(snapshot):
+    """Let every strategy finish its tick before the next refresh, so replays are repeatable"""
+    scheduler.wait_idle()
+
+if feed_recorder:
+    market_data.subscribe(feed_recorder.on_ticker, timed=True)
+market_data.subscribe(price_history.on_ticker, timed=True)
+market_data.subscribe(volatility.on_ticker, timed=True)
+market_data.subscribe(sync_accounts)
+# Matching and trailing grids run per (account, market) on the scheduler's worker pool
+market_data.subscribe(scheduler.on_ticker)
+if feed_replay:
+    market_data.subscribe(finish_ticks)
+market_data.subscribe(push_price_changes)
+market_data.start()
+
+def _request_user_id(token):
+    """User id for a bearer token (None for anonymous access); raises if access is not allowed"""
+    if token:
+        return token_verifier.verify(token)
+    if not ALLOW_ANONYMOUS:
+        raise PermissionError('No authorization token')
+    return None
+
+def with_account(f):
+    """Pass the caller's VirtualAccount, caught up with other workers, as the first argument"""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        auth_header = request.headers.get('Authorization', '')
+        token = auth_header.split(' ')[1] if auth_header.startswith('Bearer ') else None
+        try:
+            user_id = _request_user_id(token)
+        except PermissionError as e:
+            return jsonify({'error': str(e)}), 401
+        except Exception:
+            return jsonify({'error': 'Invalid token'}), 401
+        g.user_id = user_id
+        # Held for the whole request, so the registry can't close it under the route
+        with ExitStack() as held:
+            try:
+                account = held.enter_context(accounts.using(user_id))
+                account.sync()
+            except Exception as e:
+                logger.error(f"Error loading account: {str(e)}")
+                return jsonify({'error': 'Could not load account'}), 500
+            return f(account, *args, **kwargs)
+
+    return decorated
+
+@socketio.on('connect')
+def on_socket_connect(auth=None):
+    """Put the socket in its user's room so it only receives that account's changes"""
+    market = str((auth or {}).get('market', 'OMUSDT')).upper()
+    if market not in ledger.MARKET_PRECISION:
+        return False
+    try:
+        user_id = _request_user_id((auth or {}).get('token'))
+        accounts.get(user_id)
+    except Exception:
+        return False
+    join_room(account_room(user_id))
+    with _socket_watches_lock:
+        _socket_watches[request.sid] = (user_id, market)
+
+@socketio.on('disconnect')
+def on_socket_disconnect():
+    with _socket_watches_lock:
+        _socket_watches.pop(request.sid, None)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_response_status(response):
+    g.response_status = response.status_code
+    return response
+
+@app.teardown_request
+def observe_request(error=None):
+    # Teardown runs for requests that raised too, which never reach after_request
+    started = g.get('request_started')
+    if started is not None:
+        # The route pattern, not the path, so order ids don't each get a series
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        status = g.get('response_status', 500)
+        REQUEST_SECONDS.observe(time.perf_counter() - started, request.method, route, status)
+
+@app.route('/metrics')
+def get_metrics():
+    return app.response_class(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+# PROFILER_ENABLED=true serves /debug/profile; sampling only runs while a profile is being taken
+PROFILER_ENABLED = os.environ.get('PROFILER_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+_profiling = threading.Lock()
+
+@app.route('/debug/profile')
+def get_profile():
+    """Stacks of every thread sampled for ``seconds`` (at most 60), collapsed for flame graph tools"""
+    if not PROFILER_ENABLED:
+        return jsonify({'error': 'Profiler is disabled'}), 404
+    try:
+        seconds = min(float(request.args.get('seconds', 10)), 60)
+        interval = float(request.args.get('interval_ms', 5)) / 1000
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not _profiling.acquire(blocking=False):
+        return jsonify({'error': 'A profile is already running'}), 409
+    try:
+        stacks = metrics.sample_stacks(seconds, interval)
+    finally:
+        _profiling.release()
+    return app.response_class(stacks, mimetype='text/plain')
 
 @app.route('/')
 def index():
@@ -548,25 +1336,117 @@ def calculate_grid():
         if not current_price:
             return jsonify({'status': 'error', 'message': 'Could not fetch current price'})
         
-        params = grid_calculator.calculate_grid_parameters(current_price)
+        # Sized from the streaming indicators, so no history is fetched per request
+        params = grid_calculator.calculate_adaptive_parameters(current_price, volatility.get(market))
         
         if not params:
             return jsonify({'status': 'error', 'message': 'Could not calculate grid parameters'})
+
+        # Best settings from the historical sweep, applied to the current price
+        suggested = None
+        sweep_data = os.environ.get('GRID_SWEEP_DATA')
+        if sweep_data and Path(sweep_data).is_file():
+            best = grid_sweeps.best(sweep_data)
+            if best:
+                suggested = grid_calculator.calculate_grid_parameters(
+                    current_price,
+                    grid_levels=best['grid_levels'],
+                    band=best['band'],
+                    capital_fraction=best['capital_fraction']
+                )
+                if suggested:
+                    suggested['backtest'] = best
             
         return jsonify({
             'status': 'success',
             'current_price': current_price,
-            'parameters': params
+            'parameters': params,
+            'suggested': suggested
         })
         
     except Exception as e:
         logger.error(f"Error in calculate_grid: {str(e)}")
         return jsonify({'status': 'error', 'message': str(e)})
 
+@app.route('/api/grid/stress', methods=['POST'])
+def stress_test_grid():
+    """Spread of PnL, drawdown, fills and time out of band for a grid over Monte Carlo price paths.
+
+    Steps are VOLATILITY_BAR_SECONDS bars, one day of them by default. 'gbm'
+    uses the market's live EWMA volatility unless 'volatility' is given;
+    'bootstrap' resamples the candle returns of 'file' in BACKTEST_DATA_DIR.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        market = data.get('market', 'OMUSDT')
+        current_price = float(data.get('price') or market_data.get_market_price(market) or 0)
+        if not current_price:
+            return jsonify({'status': 'error', 'message': 'Could not fetch current price'})
+
+        indicators = volatility.get(market)
+        config = grid_calculator.calculate_adaptive_parameters(current_price, indicators)
+        if not config:
+            return jsonify({'status': 'error', 'message': 'Could not calculate grid parameters'})
+        for field in ('upper_price', 'lower_price', 'grid_levels', 'quantity_per_grid'):
+            if field in data:
+                config[field] = data[field]
+
+        paths = int(data.get('paths', 10000))
+        steps = int(data.get('steps', 86400 // indicators['bar_seconds']))
+        if paths * steps > STRESS_MAX_POINTS:
+            return jsonify({'status': 'error', 'message': f'paths x steps must be at most {STRESS_MAX_POINTS}'}), 400
+
+        model = data.get('model', 'gbm')
+        returns = None
+        if model == 'bootstrap':
+            path = data_file(data.get('file', ''))
+            if path is None:
+                return jsonify({'status': 'error', 'message': 'Data file not found'}), 404
+            returns = montecarlo.log_returns(backtest.load_ohlcv_cached(path))
+        sigma = float(data.get('volatility') or indicators['ewma_volatility'] or 0)
+        if model == 'gbm' and not sigma:
+            return jsonify({'status': 'error', 'message': 'Volatility is not known yet; pass volatility'}), 400
+
+        result = montecarlo.stress_test(
+            config,
+            current_price,
+            paths=paths,
+            steps=steps,
+            model=model,
+            volatility=sigma,
+            drift=float(data.get('drift', 0.0)),
+            returns=returns,
+            initial_balance=float(data.get('initial_balance', grid_calculator.total_usdt)),
+            fee_rate=float(data.get('fee_rate', backtest.DEFAULT_FEE_RATE)),
+            seed=int(data['seed']) if data.get('seed') is not None else None
+        )
+        return jsonify({'status': 'success', 'result': result})
+
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error in stress_test_grid: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/strategies')
+@with_account
+def get_strategies(account):
+    """Tick latency of the caller's strategies and of the scheduler as a whole"""
+    try:
+        return jsonify({
+            'scheduler': scheduler.summary(),
+            'strategies': scheduler.stats(account_room(g.user_id))
+        })
+    except Exception as e:
+        logger.error(f"Error fetching strategy stats: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/virtual/average-entry')
-def get_average_entry_price():
+@with_account
+def get_average_entry_price(account):
     try:
-        avg_price = virtual_account._calculate_average_entry_price()
+        market = request.args.get('market', 'OMUSDT')
+        avg_price = account._calculate_average_entry_price(market)
         return jsonify({
             'average_entry_price': avg_price
         })
@@ -575,7 +1455,8 @@ def get_average_entry_price():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/grid/start', methods=['POST'])
-def start_grid():
+@with_account
+def start_grid(account):
     try:
         data = request.get_json()
         if not data:
@@ -595,6 +1476,16 @@ def start_grid():
         grid_levels = int(data['grid_levels'])
         quantity_per_grid = float(data['quantity_per_grid'])
 
+        # Optional trailing mode: the grid follows price once it moves trail_levels intervals past the band
+        strategy = None
+        if data.get('trailing'):
+            max_recenters = data.get('max_recenters')
+            strategy = GridStrategy(
+                market, lower_price, upper_price, grid_levels, quantity_per_grid,
+                trail_levels=float(data.get('trail_levels', 1.0)),
+                max_recenters=int(max_recenters) if max_recenters is not None else None
+            )
+
         # Get current market price
         current_price = market_data.get_market_price(market)
         if not current_price:
@@ -602,82 +1493,275 @@ def start_grid():
 
         logger.info(f"Current market price: {current_price}")
 
-        # Place initial market order
-        logger.info("Placing initial market order")
-        initial_order = virtual_account.place_order(
-            market=market,
-            side="buy",
-            price=current_price,
-            quantity=quantity_per_grid
-        )
-
-        if 'error' in initial_order:
-            return jsonify({'status': 'error', 'message': initial_order['error']})
-
-        # Place grid orders
-        orders = [initial_order]
+        # Grid levels rest as limit orders; each fill places the opposite order one level away
         price_interval = (upper_price - lower_price) / (grid_levels - 1)
+        levels = [lower_price + (i * price_interval) for i in range(grid_levels)]
+        grid_orders = []
         
-        for i in range(grid_levels):
-            grid_price = lower_price + (i * price_interval)
-            
+        for i, grid_price in enumerate(levels):
             # Skip prices too close to current price
             if abs(grid_price - current_price) < price_interval * 0.5:
                 continue
 
-            order = virtual_account.place_order(
-                market=market,
-                side="sell" if grid_price > current_price else "buy",
-                price=grid_price,
-                quantity=quantity_per_grid
-            )
-            
-            if 'error' in order:
-                return jsonify({'status': 'error', 'message': order['error']})
-            
-            orders.append(order)
+            side = "sell" if grid_price > current_price else "buy"
+            counter_index = i - 1 if side == 'sell' else i + 1
+            grid_orders.append({
+                'market': market,
+                'side': side,
+                'type': 'limit',
+                'price': grid_price,
+                'quantity': quantity_per_grid,
+                'counter_price': levels[counter_index] if 0 <= counter_index < grid_levels else None
+            })
+
+        # The initial market order buys the inventory the sell levels need
+        sell_levels = sum(1 for order in grid_orders if order['side'] == 'sell')
+        batch = [{
+            'market': market,
+            'side': 'buy',
+            'type': 'market',
+            'price': current_price,
+            'quantity': quantity_per_grid * max(sell_levels, 1)
+        }] + grid_orders
+
+        logger.info(f"Placing initial market order and {len(batch) - 1} grid orders")
+        result = account.place_orders(batch)
+        if 'error' in result:
+            return jsonify({'status': 'error', 'message': result['error']})
+        orders = result['orders']
+        # Starting a grid replaces any trailing strategy from an earlier one on this market
+        if strategy or market in account.strategies:
+            account.set_strategy(market, strategy)
 
         return jsonify({
             'status': 'success',
             'message': f'Successfully placed {len(orders)} orders',
-            'orders': orders
+            'orders': orders,
+            'strategy': strategy.to_dict() if strategy else None
         })
 
     except Exception as e:
         logger.error(f"Error in start_grid: {str(e)}")
         return jsonify({'status': 'error', 'message': str(e)})
 
+@app.route('/api/grid/strategy', methods=['GET', 'DELETE'])
+@with_account
+def grid_strategy(account):
+    """Show the market's trailing grid, or stop re-centering it (its orders stay open)"""
+    try:
+        market = request.args.get('market', 'OMUSDT')
+        strategy = account.strategies.get(market)
+        if request.method == 'DELETE' and strategy:
+            account.set_strategy(market, None)
+        return jsonify({
+            'status': 'success',
+            'strategy': strategy.to_dict() if strategy and request.method == 'GET' else None
+        })
+    except Exception as e:
+        logger.error(f"Error in grid_strategy: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)})
+
+@app.route('/api/orders/batch', methods=['POST'])
+@with_account
+def place_order_batch(account):
+    try:
+        data = request.get_json()
+        if not data or not isinstance(data.get('orders'), list):
+            return jsonify({'status': 'error', 'message': 'Expected a list of orders'}), 400
+
+        result = account.place_orders(data['orders'])
+        if 'error' in result:
+            return jsonify({'status': 'error', 'message': result['error'], 'index': result.get('index')}), 400
+
+        return jsonify({
+            'status': 'success',
+            'message': f"Successfully placed {len(result['orders'])} orders",
+            'orders': result['orders']
+        })
+
+    except Exception as e:
+        logger.error(f"Error in place_order_batch: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+def data_file(name):
+    """Path of a history file in BACKTEST_DATA_DIR, or None; files outside it can't be read"""
+    data_dir = Path(os.environ.get('BACKTEST_DATA_DIR', 'data')).resolve()
+    path = (data_dir / name).resolve()
+    if data_dir not in path.parents or not path.is_file():
+        return None
+    return path
+
+@app.route('/api/backtest', methods=['POST'])
+def run_backtest():
+    try:
+        data = request.get_json() or {}
+        if not data.get('file'):
+            return jsonify({'status': 'error', 'message': 'Missing required field: file'}), 400
+
+        path = data_file(data['file'])
+        if path is None:
+            return jsonify({'status': 'error', 'message': 'Data file not found'}), 404
+
+        candles = backtest.load_ohlcv_cached(path)
+        initial_balance = float(data.get('initial_balance', grid_calculator.total_usdt))
+        config = backtest.default_grid(float(candles['open'].iloc[0]), initial_balance, levels=int(data.get('grid_levels', 6)))
+        for field in ('upper_price', 'lower_price', 'grid_levels', 'quantity_per_grid'):
+            if field in data:
+                config[field] = data[field]
+
+        result = backtest.run_backtest(
+            candles,
+            config,
+            initial_balance=initial_balance,
+            fee_rate=float(data.get('fee_rate', backtest.DEFAULT_FEE_RATE)),
+            max_fills=int(data.get('max_fills', 100))
+        )
+        return jsonify({'status': 'success', 'result': result})
+
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error in run_backtest: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/dashboard')
+@with_account
+def get_dashboard(account):
+    """Everything the dashboard refreshes, with an ETag so unchanged polls cost a 304"""
+    try:
+        market = request.args.get('market', 'OMUSDT')
+        price = market_data.get_market_price(market)
+        etag = f"{account.version}-{market}-{price}"
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+            response.set_etag(etag)
+            return response
+
+        data = account.dashboard(market, price)
+        response = jsonify(data)
+        response.set_etag(f"{data['version']}-{market}-{price}")
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    except Exception as e:
+        logger.error(f"Error building dashboard: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/virtual/balance')
 
-def get_virtual_balance():
-    return jsonify(virtual_account.balances)
+@with_account
+def get_virtual_balance(account):
+    return jsonify(account.get_balances())
 
 @app.route('/api/virtual/trades')
-def get_virtual_trades():
-    return jsonify(virtual_account.trades)
-
-# @app.route('/api/virtual/reset', methods=['POST'])
-# def reset_virtual_account():
-#     virtual_account.reset_balance()
-#     virtual_account._save_state()
-#     return jsonify({'status': 'success', 'message': 'Account reset successful'})
+@with_account
+def get_virtual_trades(account):
+    """The latest page of trades, or a page with ``limit``/``after``/``after_timestamp``, or with ``since``
+    (an account version) only newer ones; the whole history only with ``all=true``"""
+    try:
+        since = request.args.get('since', type=int)
+        if since is not None:
+            return jsonify(account.trades_since(since))
+        if request.args.get('all', '').lower() in ('1', 'true', 'yes'):
+            return jsonify(account.get_trades())
+        return jsonify(account.trades_page(
+            after=request.args.get('after', type=int),
+            after_timestamp=request.args.get('after_timestamp'),
+            limit=min(request.args.get('limit', 100, type=int), 1000)
+        ))
+    except Exception as e:
+        logger.error(f"Error fetching trades: {str(e)}")
+        return jsonify({'error': str(e)}), 500
 
 @app.route('/api/market/price/<market>')
 def get_market_price(market):
     price = market_data.get_market_price(market)
-    return jsonify({'price': price})
+    return jsonify({'price': price, 'age': market_data.get_snapshot_age()})
+
+@app.route('/api/market/prices')
+def get_market_prices():
+    markets = request.args.get('markets')
+    if markets:
+        markets = [m.strip().upper() for m in markets.split(',') if m.strip()]
+    prices = market_data.get_market_prices(markets or None)
+    return jsonify({'prices': prices, 'age': market_data.get_snapshot_age()})
+
+@app.route('/api/market/sources')
+def get_market_sources():
+    """Health and latency of each price source"""
+    return jsonify({
+        'method': market_data.aggregator.method,
+        'sources': market_data.aggregator.status(),
+        'age': market_data.get_snapshot_age()
+    })
+
+@app.route('/api/market/replay', methods=['POST'])
+def control_replay():
+    """Play or pause a FEED_REPLAY_PATH replay; 'speed' is a multiple of real time or 'max'"""
+    try:
+        if feed_replay is None:
+            return jsonify({'status': 'error', 'message': 'No feed is being replayed'}), 400
+        data = request.get_json(silent=True) or {}
+        action = data.get('action', 'play')
+        if action == 'play':
+            speed = data.get('speed')
+            if speed is None:
+                feed_replay.play()
+            else:
+                feed_replay.play(None if speed == 'max' else float(speed))
+        elif action == 'pause':
+            feed_replay.pause()
+        else:
+            return jsonify({'status': 'error', 'message': 'action must be play or pause'}), 400
+        return jsonify({'status': 'success', 'replay': feed_replay.status()[0]})
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error controlling replay: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/market/candles')
+def get_market_candles():
+    """Candles for a time window, downsampled server-side so the payload stays bounded"""
+    try:
+        market = request.args.get('market', 'OMUSDT').upper()
+        resolution = request.args.get('resolution', '1s')
+        method = request.args.get('method', 'minmax')
+        start = request.args.get('start', type=float)
+        end = request.args.get('end', type=float)
+        points = min(request.args.get('points', 500, type=int), 5000)
+        if resolution not in RESOLUTIONS:
+            return jsonify({'status': 'error', 'message': f'resolution must be one of {", ".join(RESOLUTIONS)}'}), 400
+        if points < 1:
+            return jsonify({'status': 'error', 'message': 'points must be positive'}), 400
+        times, ohlc = price_history.candles(market, resolution, start, end, points, method)
+        return jsonify({
+            'market': market,
+            'resolution': resolution,
+            'time': times.tolist(),
+            'open': ohlc[:, 0].tolist(),
+            'high': ohlc[:, 1].tolist(),
+            'low': ohlc[:, 2].tolist(),
+            'close': ohlc[:, 3].tolist()
+        })
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error getting candles: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
 
 @app.route('/api/virtual/reset', methods=['POST'])
-def reset_virtual_account():
-    result = virtual_account.reset_all()
+@with_account
+def reset_virtual_account(account):
+    result = account.reset_all()
     return jsonify({
         'status': 'success',
         'message': 'Account reset successful',
         'data': result
     })
 @app.route('/api/virtual/pnl')
-def get_pnl():
-    pnl_data = virtual_account.calculate_pnl()
+@with_account
+def get_pnl(account):
+    pnl_data = account.calculate_pnl(request.args.get('market', 'OMUSDT'))
     if pnl_data:
         return jsonify(pnl_data)
     return jsonify({'error': 'Could not calculate PnL'})
@@ -692,7 +1776,8 @@ def forgot_password():
             return jsonify({'error': 'Email required'}), 400
             
         # Send password reset email
-        response = supabase.auth.reset_password_email(email)
+        with metrics.upstream('supabase', 'reset_password_email'):
+            response = supabase.auth.reset_password_email(email)
         
         return jsonify({
             'status': 'success',
@@ -719,10 +1804,11 @@ def reset_password():
         token = auth_header.split(' ')[1]
         
         # Update the user's password
-        response = supabase.auth.update_user(
-            token,
-            {"password": new_password}
-        )
+        with metrics.upstream('supabase', 'update_user'):
+            response = supabase.auth.update_user(
+                token,
+                {"password": new_password}
+            )
         
         return jsonify({
             'status': 'success',
@@ -732,42 +1818,52 @@ def reset_password():
     except Exception as e:
         return jsonify({'error': str(e)}), 401
 @app.route('/api/virtual/active-orders')
-def get_active_orders():
+@with_account
+def get_active_orders(account):
     try:
-        # Filter for orders with status 'OPEN'
-        active_orders = [order for order in virtual_account.orders if order['status'] == 'OPEN']
-        return jsonify(active_orders)
+        market = request.args.get('market')
+        since = request.args.get('since', type=int)
+        if since is not None:
+            # Changed orders of any status; clients drop the ones no longer resting
+            return jsonify(account.orders_since(since, market))
+        with account._lock:
+            active_orders = account.get_open_orders(market)
+            version = account.version
+        response = jsonify(active_orders)
+        response.headers['X-Account-Version'] = str(version)
+        return response
     except Exception as e:
         logger.error(f"Error fetching active orders: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/virtual/orders')
+@with_account
+def get_orders(account):
+    """Order history in the order orders were placed, a page at a time"""
+    try:
+        return jsonify(account.orders_page(
+            after=request.args.get('after', type=int),
+            limit=min(request.args.get('limit', 100, type=int), 1000)
+        ))
+    except Exception as e:
+        logger.error(f"Error fetching orders: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/virtual/orders/<order_id>')
+@with_account
+def get_order(account, order_id):
+    order = account.get_order(order_id)
+    if not order:
+        return jsonify({'status': 'error', 'message': 'Order not found'}), 404
+    return jsonify(order)
+
 @app.route('/api/virtual/cancel-order/<order_id>', methods=['POST'])
-def cancel_order(order_id):
+@with_account
+def cancel_order(account, order_id):
     try:
-        # Find the order
-        order = next((order for order in virtual_account.orders if order['id'] == order_id), None)
-        
-        if not order:
-            return jsonify({'status': 'error', 'message': 'Order not found'}), 404
-            
-        if order['status'] != 'OPEN':
-            return jsonify({'status': 'error', 'message': 'Order cannot be cancelled'}), 400
-            
-        # Cancel the order
-        order['status'] = 'CANCELLED'
-        
-        # If it was a buy order, refund the USDT
-        if order['side'] == 'buy':
-            refund_amount = float(order['price']) * float(order['quantity'])
-            virtual_account.balances['USDT'] += refund_amount
-            
-        # If it was a sell order, refund the base asset
-        else:
-            base_asset = order['market'].replace('USDT', '')
-            virtual_account.balances[base_asset] += float(order['quantity'])
-            
-        virtual_account._save_state()
-        logger.info(f"Order {order_id} cancelled successfully")
+        result = account.cancel_order(order_id)
+        if 'error' in result:
+            return jsonify({'status': 'error', 'message': result['error']}), result['code']
         
         return jsonify({
             'status': 'success',
@@ -777,8 +1873,10 @@ def cancel_order(order_id):
     except Exception as e:
         logger.error(f"Error cancelling order: {str(e)}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
+
+# Registered here, after all of its routes, so gunicorn serves /auth/* too
+app.register_blueprint(auth_bp)
+
 if __name__ == '__main__':
-    # Register the auth blueprint
-    app.register_blueprint(auth_bp)
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
\ No newline at end of file
+    socketio.run(app, host='0.0.0.0', port=port, allow_unsafe_werkzeug=True)
\ No newline at end of file
@@ -0,0 +1,257 @@
+import argparse
+import json
+import logging
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+TICKS_PER_CANDLE = 4
+DEFAULT_FEE_RATE = 0.001
+
+
+def load_ohlcv(path):
+    """Load OHLCV candles from a CSV or Parquet file, sorted by timestamp"""
+    path = Path(path)
+    if path.suffix.lower() in ('.parquet', '.pq'):
+        candles = pd.read_parquet(path)
+    else:
+        candles = pd.read_csv(path)
+    candles.columns = [str(column).strip().lower() for column in candles.columns]
+
+    missing = {'open', 'high', 'low', 'close'} - set(candles.columns)
+    if missing:
+        raise ValueError(f"OHLCV file is missing columns: {', '.join(sorted(missing))}")
+    if 'timestamp' in candles.columns:
+        candles = candles.sort_values('timestamp', kind='stable').reset_index(drop=True)
+    return candles
+
+
+@lru_cache(maxsize=4)
+def _load_cached(path, mtime):
+    return load_ohlcv(path)
+
+
+def load_ohlcv_cached(path):
+    """load_ohlcv that reuses the parsed frame until the file changes"""
+    path = Path(path).resolve()
+    return _load_cached(str(path), path.stat().st_mtime)
+
+
+def price_path(candles):
+    """Flatten candles into an intrabar tick path.
+
+    Up candles are walked open -> low -> high -> close and down candles
+    open -> high -> low -> close, the usual assumption when only OHLC is known.
+    """
+    o = candles['open'].to_numpy(dtype=np.float64)
+    h = candles['high'].to_numpy(dtype=np.float64)
+    l = candles['low'].to_numpy(dtype=np.float64)
+    c = candles['close'].to_numpy(dtype=np.float64)
+    up = c >= o
+    return np.column_stack([o, np.where(up, l, h), np.where(up, h, l), c]).ravel()
+
+
+def grid_levels(lower_price, upper_price, levels):
+    return np.linspace(float(lower_price), float(upper_price), int(levels))
+
+
+def grid_state(path, levels):
+    """Index of the empty grid level at every tick of ``path``.
+
+    The grid keeps buys below and sells above one empty level. A fill moves the
+    gap to the filled level, so the gap is always either the number of levels
+    below the price (``a``) or one less, depending on whether the last level
+    change was downward or upward. That makes the whole simulation a
+    searchsorted plus a forward fill instead of a per-tick loop. ``path`` may
+    also be a (paths, ticks) batch, simulated row by row in the same passes.
+    """
+    below = np.searchsorted(levels, path, side='left')
+    step = np.diff(below, prepend=below[..., :1], axis=-1)
+    last_change = np.where(step != 0, np.arange(path.shape[-1]), 0)
+    np.maximum.accumulate(last_change, axis=-1, out=last_change)
+    direction = np.take_along_axis(step, last_change, axis=-1)
+
+    # Before any level is crossed, the gap is the level nearest the start price
+    start = path[..., :1]
+    gap0 = np.abs(levels - start).argmin(axis=-1)
+    initial_up = gap0 < below[..., 0]
+    went_up = np.where(direction != 0, direction > 0, initial_up[..., None])
+    return np.clip(below - went_up, 0, len(levels) - 1), gap0
+
+
+def simulate_grid(path, levels, quantity, initial_balance=1000.0, fee_rate=DEFAULT_FEE_RATE):
+    """Run a grid over a tick path; returns per-tick arrays plus the fill mask.
+
+    The initial market order buys the inventory for every sell level above the
+    starting gap, matching /api/grid/start. For a (paths, ticks) batch every
+    array gains the leading paths axis and the scalars become per-path arrays.
+    """
+    n = len(levels)
+    gap, gap0 = grid_state(path, levels)
+    previous = np.concatenate((gap0[..., None], gap[..., :-1]), axis=-1)
+    delta = gap - previous
+
+    prefix = np.concatenate(([0.0], np.cumsum(levels)))
+    sells = np.where(delta > 0, delta, 0)
+    buys = np.where(delta < 0, -delta, 0)
+    sell_value = np.where(delta > 0, quantity * (prefix[gap + 1] - prefix[previous + 1]), 0.0)
+    buy_value = np.where(delta < 0, quantity * (prefix[previous] - prefix[gap]), 0.0)
+    fees = fee_rate * (sell_value + buy_value)
+    # Each sell at level j closes a buy from level j - 1, which telescopes to L[gap] - L[previous]
+    realized = np.where(delta > 0, quantity * (levels[gap] - levels[previous]), 0.0)
+
+    initial_units = n - 1 - gap0
+    initial_cost = initial_units * quantity * path[..., 0]
+    initial_fee = fee_rate * initial_cost
+    cash = (initial_balance - initial_cost - initial_fee)[..., None] + np.cumsum(sell_value - buy_value - fees, axis=-1)
+    inventory = (n - 1 - gap) * quantity
+    equity = cash + inventory * path
+
+    return {
+        'equity': equity,
+        'inventory': inventory,
+        'sells': sells,
+        'buys': buys,
+        'sell_value': sell_value,
+        'buy_value': buy_value,
+        'realized': realized,
+        'fees': fees,
+        'initial_fee': initial_fee,
+        'capital_required': initial_cost + initial_fee + quantity * prefix[gap0]
+    }
+
+
+def summarize(path, simulation, initial_balance, periods_per_year=525600):
+    equity = simulation['equity']
+    running_max = np.maximum.accumulate(equity)
+    drawdown = running_max - equity
+    worst = int(drawdown.argmax())
+
+    fees = float(simulation['fees'].sum() + simulation['initial_fee'])
+    realized_pnl = float(simulation['realized'].sum())
+    total_pnl = float(equity[-1] - initial_balance)
+
+    # Sharpe on candle closes, annualised with the candle frequency
+    closes = equity[TICKS_PER_CANDLE - 1::TICKS_PER_CANDLE]
+    returns = np.diff(closes) / closes[:-1] if len(closes) > 1 else np.zeros(0)
+    std = returns.std() if len(returns) else 0.0
+    sharpe = float(returns.mean() / std * np.sqrt(periods_per_year)) if std > 0 else 0.0
+
+    return {
+        'buy_fills': int(simulation['buys'].sum()),
+        'sell_fills': int(simulation['sells'].sum()),
+        'realized_pnl': realized_pnl,
+        'unrealized_pnl': total_pnl - realized_pnl + fees,
+        'fees': fees,
+        'total_pnl': total_pnl,
+        'total_pnl_percent': total_pnl / initial_balance * 100 if initial_balance else 0,
+        'max_drawdown': float(drawdown[worst]),
+        'max_drawdown_percent': float(drawdown[worst] / running_max[worst] * 100) if running_max[worst] else 0,
+        'sharpe': sharpe,
+        'final_equity': float(equity[-1]),
+        'final_inventory': float(simulation['inventory'][-1]),
+        'capital_required': float(simulation['capital_required']),
+        'start_price': float(path[0]),
+        'end_price': float(path[-1])
+    }
+
+
+def fill_events(candles, simulation, limit=None):
+    """Ticks where levels filled, as a DataFrame (one row per tick, several levels may fill at once)"""
+    ticks = np.flatnonzero(simulation['sells'] + simulation['buys'])
+    if limit is not None:
+        ticks = ticks[:limit]
+    candle_index = ticks // TICKS_PER_CANDLE
+    events = pd.DataFrame({
+        'candle': candle_index,
+        'side': np.where(simulation['sells'][ticks] > 0, 'sell', 'buy'),
+        'levels': (simulation['sells'] + simulation['buys'])[ticks],
+        'value': (simulation['sell_value'] + simulation['buy_value'])[ticks]
+    })
+    if 'timestamp' in candles.columns:
+        events.insert(0, 'timestamp', candles['timestamp'].to_numpy()[candle_index])
+    return events
+
+
+def periods_per_year(candles):
+    if 'timestamp' not in candles.columns or len(candles) < 2:
+        return 525600
+    timestamps = candles['timestamp']
+    if pd.api.types.is_numeric_dtype(timestamps):
+        step = float(np.median(np.diff(timestamps.to_numpy(dtype=np.float64))))
+        if timestamps.iloc[0] > 1e11:  # epoch milliseconds
+            step /= 1000
+    else:
+        step = float(pd.to_datetime(timestamps).diff().dt.total_seconds().median())
+    return 365 * 24 * 3600 / step if step > 0 else 525600
+
+
+def default_grid(price, initial_balance, band=0.003, levels=6, capital_fraction=0.8):
+    """Grid centred on ``price`` sized like GridCalculator.calculate_grid_parameters"""
+    margin = price * band
+    return {
+        'lower_price': price - margin,
+        'upper_price': price + margin,
+        'grid_levels': levels,
+        'quantity_per_grid': round(initial_balance * capital_fraction / (levels * price), 6)
+    }
+
+
+def run_backtest(candles, config, initial_balance=1000.0, fee_rate=DEFAULT_FEE_RATE, max_fills=100):
+    """Backtest a grid configuration (as produced by GridCalculator) over OHLCV candles"""
+    if len(candles) == 0:
+        raise ValueError('No candles to backtest')
+    if int(config['grid_levels']) < 2:
+        raise ValueError('A grid needs at least 2 levels')
+
+    path = price_path(candles)
+    levels = grid_levels(config['lower_price'], config['upper_price'], config['grid_levels'])
+    quantity = float(config['quantity_per_grid'])
+    simulation = simulate_grid(path, levels, quantity, initial_balance, fee_rate)
+
+    result = summarize(path, simulation, initial_balance, periods_per_year(candles))
+    result['candles'] = len(candles)
+    result['config'] = {
+        'lower_price': float(levels[0]),
+        'upper_price': float(levels[-1]),
+        'grid_levels': len(levels),
+        'quantity_per_grid': quantity
+    }
+    if max_fills:
+        events = fill_events(candles, simulation, max_fills)
+        result['fills'] = json.loads(events.to_json(orient='records', date_format='iso'))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backtest a grid configuration over OHLCV candles')
+    parser.add_argument('path', help='CSV or Parquet file with open, high, low, close (and timestamp) columns')
+    parser.add_argument('--lower', type=float, help='lower grid price (default: first open minus --band)')
+    parser.add_argument('--upper', type=float, help='upper grid price (default: first open plus --band)')
+    parser.add_argument('--levels', type=int, default=6)
+    parser.add_argument('--quantity', type=float, help='quantity per grid level')
+    parser.add_argument('--band', type=float, default=0.003, help='half-width of the default grid as a fraction of price')
+    parser.add_argument('--balance', type=float, default=1000.0)
+    parser.add_argument('--fee', type=float, default=DEFAULT_FEE_RATE)
+    parser.add_argument('--fills', type=int, default=0, help='number of fill events to include')
+    args = parser.parse_args()
+
+    candles = load_ohlcv(args.path)
+    config = default_grid(float(candles['open'].iloc[0]), args.balance, args.band, args.levels)
+    if args.lower is not None:
+        config['lower_price'] = args.lower
+    if args.upper is not None:
+        config['upper_price'] = args.upper
+    if args.quantity is not None:
+        config['quantity_per_grid'] = args.quantity
+
+    result = run_backtest(candles, config, args.balance, args.fee, args.fills)
+    print(json.dumps(result, indent=2, default=str))
+
+
+if __name__ == '__main__':
+    main()
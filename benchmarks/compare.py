@@ -0,0 +1,64 @@
+import argparse
+import json
+import sys
+
+
+def latencies(result):
+    """{benchmark name: latency summary} for every micro-benchmark and load route in a result file"""
+    flat = {}
+    for size, groups in result.get('micro', {}).items():
+        for group, benchmarks in groups.items():
+            for name, summary in benchmarks.items():
+                flat[f"micro/{size}/{group}/{name}"] = summary
+    for name, summary in result.get('load', {}).get('routes', {}).items():
+        flat[f"load/{name}"] = summary
+    return flat
+
+
+def compare(baseline, current, metric='p50_us', threshold=0.2):
+    """Rows of (name, baseline, current, change) and the names that got slower by more than ``threshold``"""
+    rows, regressions = [], []
+    before, after = latencies(baseline), latencies(current)
+    for name in sorted(before.keys() & after.keys()):
+        old, new = before[name].get(metric), after[name].get(metric)
+        if not old or new is None:
+            continue
+        change = new / old - 1
+        rows.append((name, old, new, change))
+        if change > threshold:
+            regressions.append(name)
+    old_rate = baseline.get('load', {}).get('requests_per_second')
+    new_rate = current.get('load', {}).get('requests_per_second')
+    if old_rate and new_rate is not None:
+        # Throughput: lower is worse, so the change is flipped to read like a latency
+        change = old_rate / new_rate - 1 if new_rate else float('inf')
+        rows.append(('load/requests_per_second', old_rate, new_rate, change))
+        if change > threshold:
+            regressions.append('load/requests_per_second')
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare two benchmark result files and flag regressions')
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--metric', default='p50_us', help='latency statistic to compare (p50_us, p95_us, mean_us, ...)')
+    parser.add_argument('--threshold', type=float, default=0.2, help='relative slowdown that counts as a regression')
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    rows, regressions = compare(baseline, current, args.metric, args.threshold)
+    width = max((len(row[0]) for row in rows), default=10)
+    for name, old, new, change in rows:
+        flag = '  REGRESSION' if name in regressions else ''
+        print(f"{name:<{width}}  {old:>12.2f}  {new:>12.2f}  {change:>+8.1%}{flag}")
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+BENCH_SECRET = 'benchmark-secret'
+
+
+def import_app(workdir, exchange_url, refresh_interval=0.5, quiet=True):
+    """Import app.py against a stub exchange, with every account file under ``workdir``.
+
+    app starts its ticker thread on import, so the environment has to be set first.
+    ``quiet`` drops the per-order INFO log lines, which would otherwise flood the output.
+    """
+    workdir = Path(workdir)
+    workdir.mkdir(parents=True, exist_ok=True)
+    os.environ.update({
+        'COINDCX_BASE_URL': exchange_url,
+        'PRICE_SOURCES': 'coindcx',
+        'TICKER_REFRESH_INTERVAL': str(refresh_interval),
+        'ACCOUNT_STATE_PATH': str(workdir / 'anonymous.json'),
+        'ACCOUNTS_DIR': str(workdir / 'accounts'),
+        'ACCOUNT_CACHE_SIZE': os.environ.get('ACCOUNT_CACHE_SIZE', '4096'),
+        'SUPABASE_JWT_SECRET': os.environ.get('SUPABASE_JWT_SECRET', BENCH_SECRET),
+        'ALLOW_ANONYMOUS_ACCOUNT': 'true'  # for load.py --anonymous
+    })
+    # Supabase is never called (tokens are checked locally), but the client needs a JWT-shaped key to start
+    os.environ.setdefault('SUPABASE_URL', 'http://127.0.0.1:9')
+    os.environ.setdefault('SUPABASE_KEY', 'eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.benchmark')
+    import app
+    if quiet:
+        logging.disable(logging.INFO)
+    return app
+
+
+def token(user_id):
+    from token_verifier import mint_token
+    return mint_token(os.environ.get('SUPABASE_JWT_SECRET', BENCH_SECRET), user_id, expires_in=24 * 3600)
+
+
+def latency_summary(samples):
+    """Run count and latency percentiles in microseconds of a list of durations in seconds"""
+    if not samples:
+        return {'runs': 0}
+    ordered = sorted(samples)
+    pick = lambda fraction: ordered[min(int(len(ordered) * fraction), len(ordered) - 1)] * 1e6
+    return {
+        'runs': len(ordered),
+        'mean_us': round(sum(ordered) / len(ordered) * 1e6, 2),
+        'min_us': round(ordered[0] * 1e6, 2),
+        'p50_us': round(pick(0.5), 2),
+        'p95_us': round(pick(0.95), 2),
+        'p99_us': round(pick(0.99), 2),
+        'max_us': round(ordered[-1] * 1e6, 2)
+    }
+
+
+def environment():
+    """What a result was measured on, so comparisons across machines can be spotted"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                                timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count()
+    }
+
+
+def write_json(result, output):
+    text = json.dumps(result, indent=2)
+    if output in (None, '-'):
+        print(text)
+        return
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    Path(output).write_text(text + '\n')
+    print(f"Wrote {output}", file=sys.stderr)
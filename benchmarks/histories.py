@@ -0,0 +1,88 @@
+import argparse
+import random
+import shutil
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import harness  # noqa: F401  (puts the repository on sys.path)
+import ledger
+from account_journal import AccountJournal
+from ledger import market_precision
+
+DEFAULT_SIZES = (10, 1000, 100000)
+START_TIME = datetime(2024, 1, 1)
+
+
+def history_state(trades, seed=1, market='OMUSDT', start_price=7.5, max_inventory=20):
+    """Account state with ``trades`` filled market orders from a seeded grid-like random walk.
+
+    Buys and sells alternate around a drifting price with the inventory kept
+    between 0 and ``max_inventory`` lots, so the history has realized PnL, wins
+    and losses like a running grid. Balances are worked out in ticks, exactly
+    as the account would have them.
+    """
+    rng = random.Random(seed)
+    precision = market_precision(market)
+    base = market[:-len(ledger.QUOTE_ASSET)]
+    usdt = ledger.to_ticks(max(1000.0, trades * start_price), 'USDT')
+    held = 0
+    lot = precision.quantity(1)
+    price = start_price
+    orders, fills = [], []
+    for i in range(trades):
+        price *= 1 + rng.gauss(0, 0.002)
+        side = 'buy' if held == 0 or (held < max_inventory * lot and rng.random() < 0.5) else 'sell'
+        price_ticks = precision.price(price)
+        value = precision.value(price_ticks, lot)
+        if side == 'buy':
+            usdt -= value
+            held += lot
+        else:
+            usdt += value
+            held -= lot
+        order_id = f"bench-{i}"
+        timestamp = (START_TIME + timedelta(seconds=i)).isoformat()
+        order = ledger.Order(order_id, market, side, 'market', price_ticks, lot, 'FILLED', timestamp)
+        orders.append(order.to_dict())
+        fills.append(ledger.Trade(order_id, market, side, price_ticks, lot, timestamp).to_dict())
+
+    balances = {'USDT': ledger.from_ticks(usdt, 'USDT'), 'OM': 0, 'ETH': 0, 'BNB': 0, 'XRP': 0, 'SOL': 0}
+    balances[base] = ledger.from_ticks(held, base)
+    return {'version': 2, 'balances': balances, 'orders': orders, 'trades': fills, 'strategies': []}
+
+
+def make_history(directory, trades, seed=1):
+    """Path of an account snapshot with ``trades`` trades, generated once and reused afterwards"""
+    path = Path(directory) / f"history-{trades}-{seed}.json"
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        state = history_state(trades, seed)
+        journal = AccountJournal(path)
+        journal.compact(state, background=False)
+        journal.close()
+    return path
+
+
+def working_copy(history, directory):
+    """Fresh copy of a history for a benchmark to modify"""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    for stale in directory.glob(f"{history.name}*"):
+        stale.unlink()
+    target = directory / history.name
+    shutil.copyfile(history, target)
+    return target
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic account histories for the benchmarks')
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)), help='trade counts, e.g. 10,1000,1000000')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--dir', default=str(harness.ROOT / 'benchmarks' / 'data'))
+    args = parser.parse_args()
+    for size in (int(size) for size in args.sizes.split(',') if size.strip()):
+        print(make_history(args.dir, size, args.seed))
+
+
+if __name__ == '__main__':
+    main()
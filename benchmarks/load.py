@@ -0,0 +1,161 @@
+import argparse
+import heapq
+import random
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import requests
+
+import harness
+from harness import latency_summary
+from stub_exchange import StubExchange
+
+MARKET = 'OMUSDT'
+# How often index.html polls each endpoint without the push channel, in seconds
+POLL_INTERVALS = {'price': 1, 'trades': 5, 'dashboard': 5}
+
+
+class PollingClient:
+    """One dashboard: a grid of its own, then index.html's fallback polling at the page's intervals.
+
+    The load is open-loop: each endpoint is requested every ``POLL_INTERVALS``
+    seconds from a random phase whether or not earlier requests have come back,
+    and latency counts from when a request was due, so a server falling behind
+    shows up as latency instead of as fewer requests. The dashboard is polled
+    with its ETag and trades with the last seen version, and open orders are
+    refetched only when the dashboard reports a new version, the same way the
+    page does.
+    """
+
+    def __init__(self, url, user_id, seed):
+        self.url = url
+        self.session = requests.Session()
+        if user_id is not None:
+            self.session.headers['Authorization'] = f"Bearer {harness.token(user_id)}"
+        self.random = random.Random(seed)
+        self.version = 0
+        self.etag = None
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def request(self, name, method, path, due=None, **kwargs):
+        started = time.perf_counter() if due is None else due
+        try:
+            response = self.session.request(method, self.url + path, timeout=30, **kwargs)
+            elapsed = time.perf_counter() - started
+            if response.status_code >= 400:
+                self.errors[name] += 1
+                return None
+            self.samples[name].append(elapsed)
+            return response
+        except requests.RequestException:
+            self.errors[name] += 1
+            return None
+
+    def start_grid(self):
+        price = self.request('price', 'GET', f"/api/market/price/{MARKET}").json()['price']
+        self.samples['price'].clear()  # setup, not part of the measured polling
+        self.request('start_grid', 'POST', '/api/grid/start', json={
+            'market': MARKET, 'lower_price': round(price * 0.995, 4), 'upper_price': round(price * 1.005, 4),
+            'grid_levels': 6, 'quantity_per_grid': 1, 'trailing': True
+        })
+
+    def run(self, stop):
+        """Poll every endpoint on its interval until ``stop`` is set"""
+        now = time.perf_counter()
+        schedule = [(now + self.random.uniform(0, interval), name) for name, interval in POLL_INTERVALS.items()]
+        heapq.heapify(schedule)
+        while True:
+            due, action = heapq.heappop(schedule)
+            if stop.wait(max(due - time.perf_counter(), 0)):
+                return
+            self.poll(action, due)
+            heapq.heappush(schedule, (due + POLL_INTERVALS[action], action))
+
+    def poll(self, action, due):
+        if action == 'price':
+            self.request('price', 'GET', f"/api/market/price/{MARKET}", due)
+        elif action == 'trades':
+            self.request('trades', 'GET', f"/api/virtual/trades?since={self.version}", due)
+        else:
+            headers = {'If-None-Match': self.etag} if self.etag else {}
+            response = self.request('dashboard', 'GET', f"/api/dashboard?market={MARKET}", due, headers=headers)
+            if response is not None and response.status_code == 200:
+                self.etag = response.headers.get('ETag')
+                version = response.json()['version']
+                if version != self.version:
+                    self.version = version
+                    self.request('active_orders', 'GET', f"/api/virtual/active-orders?market={MARKET}")
+
+
+def run_load(url, clients=200, seconds=10.0, anonymous=False, seed=1):
+    """Run ``clients`` polling dashboards against ``url`` for ``seconds``; returns throughput and latencies"""
+    users = [PollingClient(url, None if anonymous else f"load{i}", seed + i) for i in range(clients)]
+    for client in users:
+        client.start_grid()
+    stop = threading.Event()
+    threads = [threading.Thread(target=client.run, args=(stop,), daemon=True) for client in users]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    samples, errors = defaultdict(list), defaultdict(int)
+    for client in users:
+        for name, values in client.samples.items():
+            samples[name].extend(values)
+        for name, count in client.errors.items():
+            errors[name] += count
+    # start_grid ran before the clock started; it is reported but not part of the throughput
+    polled = sum(len(values) for name, values in samples.items() if name != 'start_grid')
+    return {
+        'clients': clients,
+        'seconds': round(elapsed, 3),
+        'requests': polled,
+        # What the pages would send, not counting the active-orders refetches that follow a change
+        'offered_per_second': round(clients * sum(1 / interval for interval in POLL_INTERVALS.values()), 1),
+        'requests_per_second': round(polled / elapsed, 1),
+        'errors': dict(errors),
+        'routes': {name: latency_summary(values) for name, values in sorted(samples.items())}
+    }
+
+
+def serve_app(exchange_url, workdir):
+    """Serve app.py on a local port with werkzeug's threaded server; returns its base URL"""
+    from werkzeug.serving import make_server
+    app = harness.import_app(workdir, exchange_url)
+    server = make_server('127.0.0.1', 0, app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='bench-server', daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay the dashboard's polling mix against the Flask app")
+    parser.add_argument('--url', help='running server to load (default: start the app and a stub exchange here)')
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--anonymous', action='store_true', help="share the anonymous account instead of one user each")
+    parser.add_argument('--output', default='-', help="JSON file to write ('-' for stdout)")
+    args = parser.parse_args()
+
+    url, exchange = args.url, None
+    if url is None:
+        exchange = StubExchange().start()
+        url = serve_app(exchange.url, Path(tempfile.mkdtemp(prefix='gridbot-load-')))
+    try:
+        result = run_load(url.rstrip('/'), args.clients, args.seconds, args.anonymous)
+    finally:
+        if exchange:
+            exchange.stop()
+    harness.write_json({'environment': harness.environment(), 'load': result}, args.output)
+
+
+if __name__ == '__main__':
+    main()
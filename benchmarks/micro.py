@@ -0,0 +1,152 @@
+import argparse
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import harness
+import ledger
+from harness import latency_summary
+from histories import DEFAULT_SIZES, make_history, working_copy
+from stub_exchange import StubExchange
+
+MARKET = 'OMUSDT'
+# Dashboard polling, as index.html does it when the push channel is down
+POLLING_ROUTES = (
+    ('market_price', '/api/market/price/OMUSDT'),
+    ('dashboard', '/api/dashboard?market=OMUSDT'),
+    ('trades_recent', '/api/virtual/trades?limit=50'),
+    ('active_orders', '/api/virtual/active-orders?market=OMUSDT'),
+    ('pnl', '/api/virtual/pnl'),
+    ('grid_calculate', '/api/grid/calculate')
+)
+
+
+def measure(fn, repeat, setup=None, teardown=None):
+    """Latency summary of ``repeat`` calls of ``fn``; ``setup``/``teardown`` run untimed around each call"""
+    samples = []
+    for _ in range(repeat):
+        state = setup() if setup else None
+        started = time.perf_counter()
+        result = fn(state) if setup else fn()
+        samples.append(time.perf_counter() - started)
+        if teardown:
+            teardown(result)
+    return latency_summary(samples)
+
+
+def account_benchmarks(app, history, size, workdir, repeat):
+    """VirtualAccount methods on an account loaded from ``history``"""
+    # Loading and snapshotting are linear in the history, so they run fewer times on big ones
+    heavy = max(2, min(20, 2000000 // max(size, 1)))
+    working = working_copy(history, workdir)
+    results = {'load_state': measure(lambda: app.VirtualAccount(state_path=working), heavy,
+                                     teardown=lambda account: account.close())}
+
+    account = app.VirtualAccount(state_path=working_copy(history, workdir))
+    price = app.market_data.get_market_price(MARKET)
+    far = round(price * 0.5, 4)  # resting buys that the ticker won't fill during the run
+
+    results['calculate_pnl'] = measure(lambda: account.calculate_pnl(MARKET, price), repeat)
+    results['dashboard'] = measure(lambda: account.dashboard(MARKET, price), repeat)
+    results['trades_page'] = measure(lambda: account.trades_page(limit=50), repeat)
+    results['trades_since'] = measure(lambda: account.trades_since(max(account.version - 10, 0)), repeat)
+    results['place_order_limit'] = measure(
+        lambda: account.place_order(MARKET, 'buy', far, 1, 'limit'), repeat,
+        teardown=lambda order: account.cancel_order(order['id']))
+    results['cancel_order'] = measure(
+        lambda order_id: account.cancel_order(order_id), repeat,
+        setup=lambda: account.place_order(MARKET, 'buy', far, 1, 'limit')['id'])
+    results['place_order_market'] = measure(lambda: account.place_order(MARKET, 'buy', price, 0.1, 'market'), repeat)
+    batch = [{'market': MARKET, 'side': 'buy', 'type': 'limit', 'price': far * (1 - i / 100), 'quantity': 1}
+             for i in range(10)]
+    results['place_orders_batch10'] = measure(
+        lambda: account.place_orders(batch), max(repeat // 10, 5),
+        teardown=lambda result: [account.cancel_order(order['id']) for order in result['orders']])
+
+    # A tick that crosses nothing, against a book of 10 resting orders
+    resting = account.place_orders(batch)['orders']
+    results['match_orders'] = measure(lambda: account.match_orders(MARKET, price), repeat)
+    for order in resting:
+        account.cancel_order(order['id'])
+    # What a commit writes to the journal, and the full snapshot a compaction writes in the background
+    record = [ledger.encode_record({'op': 'balances', 'balances': {}})]
+    results['journal_append'] = measure(lambda: account.journal.append(record), repeat)
+    results['compact'] = measure(lambda: account.journal.compact(account._state_copy(), background=False), heavy)
+    account.close()
+    return results
+
+
+def route_benchmarks(app, history, size, repeat):
+    """Polling endpoints and /api/grid/start through Flask's test client, for a user with ``history``"""
+    user_id = f"bench{size}"
+    accounts_dir = Path(app.ACCOUNTS_DIR)
+    accounts_dir.mkdir(parents=True, exist_ok=True)
+    for stale in accounts_dir.glob(f"{user_id}.json*"):
+        stale.unlink()
+    shutil.copyfile(history, accounts_dir / f"{user_id}.json")
+    client = app.app.test_client()
+    headers = {'Authorization': f"Bearer {harness.token(user_id)}"}
+    price = app.market_data.get_market_price(MARKET)
+
+    def get(path):
+        response = client.get(path, headers=headers)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{path} returned {response.status_code}")
+        return response
+
+    results = {}
+    get('/api/virtual/balance')  # loads the account before anything is timed
+    for name, path in POLLING_ROUTES:
+        results[name] = measure(lambda: get(path), repeat)
+
+    grid = {'market': MARKET, 'lower_price': round(price * 0.99, 4), 'upper_price': round(price * 1.01, 4),
+            'grid_levels': 6, 'quantity_per_grid': 1}
+
+    def start_grid():
+        response = client.post('/api/grid/start', json=grid, headers=headers)
+        if response.json.get('status') != 'success':
+            raise RuntimeError(f"/api/grid/start failed: {response.json}")
+
+    # Each start is followed by cancelling the grid's orders, untimed, so every run starts the same way
+    def cancel_grid(_):
+        for order in get(f'/api/virtual/active-orders?market={MARKET}').json:
+            client.post(f"/api/virtual/cancel-order/{order['id']}", headers=headers)
+
+    results['start_grid'] = measure(start_grid, max(repeat // 10, 5), teardown=cancel_grid)
+    return results
+
+
+def run_micro(sizes=DEFAULT_SIZES, repeat=200, data_dir=None, workdir=None, exchange=None):
+    """Micro-benchmarks for each history size; returns {size: {'account': ..., 'routes': ...}}"""
+    own_exchange = exchange is None
+    exchange = exchange or StubExchange(step_interval=3600).start()
+    workdir = Path(workdir or tempfile.mkdtemp(prefix='gridbot-bench-'))
+    data_dir = Path(data_dir or harness.ROOT / 'benchmarks' / 'data')
+    try:
+        app = harness.import_app(workdir / 'app', exchange.url)
+        results = {}
+        for size in sizes:
+            history = make_history(data_dir, size)
+            results[str(size)] = {
+                'account': account_benchmarks(app, history, size, workdir / 'accounts', repeat),
+                'routes': route_benchmarks(app, history, size, repeat)
+            }
+        return results
+    finally:
+        if own_exchange:
+            exchange.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmarks of VirtualAccount methods and polling endpoints')
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)), help='trade counts of the histories')
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--output', default='-', help="JSON file to write ('-' for stdout)")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    harness.write_json({'environment': harness.environment(), 'micro': run_micro(sizes, args.repeat)}, args.output)
+
+
+if __name__ == '__main__':
+    main()
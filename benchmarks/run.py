@@ -0,0 +1,48 @@
+import argparse
+import tempfile
+from pathlib import Path
+
+import harness
+from histories import DEFAULT_SIZES
+from load import run_load, serve_app
+from micro import run_micro
+from stub_exchange import StubExchange
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the micro-benchmarks and the polling load test, and save JSON')
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help='trade counts of the account histories (up to 1000000)')
+    parser.add_argument('--repeat', type=int, default=200, help='runs of each micro-benchmark')
+    parser.add_argument('--clients', type=int, default=200, help='polling dashboards in the load test (0 skips it)')
+    parser.add_argument('--seconds', type=float, default=10.0, help='length of the load test')
+    parser.add_argument('--output', help='JSON file (default: benchmarks/results/<time>-<commit>.json)')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    environment = harness.environment()
+    workdir = Path(tempfile.mkdtemp(prefix='gridbot-bench-'))
+    # Prices hold still so every account benchmark sees the same book; the load test's ticker keeps moving
+    exchange = StubExchange(step_interval=3600).start()
+    try:
+        result = {
+            'environment': environment,
+            'options': {'sizes': sizes, 'repeat': args.repeat, 'clients': args.clients, 'seconds': args.seconds},
+            'micro': run_micro(sizes, args.repeat, workdir=workdir, exchange=exchange)
+        }
+        if args.clients:
+            # The app is already imported against this exchange; serve it and let prices walk
+            exchange.step_interval = 0.5
+            exchange.start_walk()
+            url = serve_app(exchange.url, workdir / 'app')
+            result['load'] = run_load(url, args.clients, args.seconds)
+    finally:
+        exchange.stop()
+
+    output = args.output or harness.ROOT / 'benchmarks' / 'results' / (
+        f"{environment['time'].replace(':', '')}-{(environment['commit'] or 'unknown')[:8]}.json")
+    harness.write_json(result, str(output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+START_PRICES = {'OMUSDT': 7.5, 'ETHUSDT': 2500.0, 'BNBUSDT': 600.0, 'XRPUSDT': 0.6, 'SOLUSDT': 150.0}
+
+
+class StubExchange:
+    """A local stand-in for CoinDCX's public API, with seeded random-walk prices.
+
+    Serves /exchange/ticker in CoinDCX's format for the markets the bot trades
+    plus ``filler_markets`` idle ones (the real ticker lists hundreds),
+    /exchange/v1/markets_details and /market_data/orderbook. Prices take a step
+    every ``step_interval`` seconds; ``volatility`` is the per-step log return
+    standard deviation. The same seed gives the same sequence of prices.
+    """
+
+    def __init__(self, port=0, seed=1, volatility=0.0005, step_interval=0.5, filler_markets=400, latency=0.0):
+        self.random = random.Random(seed)
+        self.volatility = volatility
+        self.step_interval = step_interval
+        self.latency = latency  # added to every response, to mimic a remote exchange
+        self.prices = dict(START_PRICES)
+        self.filler = [f"FILL{i}USDT" for i in range(filler_markets)]
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()  # set to apply a new step_interval right away
+        self._walker = None
+        exchange = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                exchange.requests += 1
+                if exchange.latency:
+                    time.sleep(exchange.latency)
+                url = urlparse(self.path)
+                if url.path == '/exchange/ticker':
+                    body = exchange.ticker()
+                elif url.path == '/exchange/v1/markets_details':
+                    body = exchange.markets_details()
+                elif url.path == '/market_data/orderbook':
+                    body = exchange.orderbook(parse_qs(url.query).get('pair', [''])[0])
+                else:
+                    self.send_error(404)
+                    return
+                payload = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.server.daemon_threads = True
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name='stub-exchange', daemon=True).start()
+        return self.start_walk()
+
+    def start_walk(self):
+        """Start stepping prices every ``step_interval`` seconds; a walk already running picks up a new interval"""
+        self._wake.set()
+        if self._walker is None:
+            self._walker = threading.Thread(target=self._walk, name='stub-exchange-prices', daemon=True)
+            self._walker.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _walk(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            if not self._wake.wait(self.step_interval):
+                self.step()
+
+    def step(self):
+        with self._lock:
+            for market, price in self.prices.items():
+                self.prices[market] = price * math.exp(self.random.gauss(0, self.volatility))
+
+    def ticker(self):
+        now = int(time.time() * 1000)
+        with self._lock:
+            prices = dict(self.prices)
+        tickers = [{
+            'market': market,
+            'last_price': f"{price:.6g}",
+            'bid': f"{price * 0.9995:.6g}",
+            'ask': f"{price * 1.0005:.6g}",
+            'volume': '1000000',
+            'high': f"{price * 1.01:.6g}",
+            'low': f"{price * 0.99:.6g}",
+            'change_24_hour': '0.0',
+            'timestamp': now
+        } for market, price in prices.items()]
+        tickers.extend({'market': market, 'last_price': '1.0', 'bid': '0.999', 'ask': '1.001', 'volume': '10',
+                        'timestamp': now} for market in self.filler)
+        return tickers
+
+    def markets_details(self):
+        return [{'coindcx_name': market, 'pair': f"B-{market[:-4]}_USDT"} for market in self.prices]
+
+    def orderbook(self, pair):
+        market = pair[2:].replace('_', '') if pair.startswith('B-') else pair
+        with self._lock:
+            price = self.prices.get(market)
+        if price is None:
+            return {'bids': {}, 'asks': {}}
+        # 20 levels each side, 0.05% apart, growing in size away from the touch
+        size = 1000 / price
+        return {
+            'bids': {f"{price * (1 - 0.0005 * (i + 1)):.6g}": f"{size * (i + 1):.6g}" for i in range(20)},
+            'asks': {f"{price * (1 + 0.0005 * (i + 1)):.6g}": f"{size * (i + 1):.6g}" for i in range(20)}
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a stub CoinDCX ticker for benchmarks and offline runs')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--volatility', type=float, default=0.0005, help='per-step log return std')
+    parser.add_argument('--step', type=float, default=0.5, help='seconds between price steps')
+    parser.add_argument('--filler', type=int, default=400, help='idle markets added to the ticker')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    args = parser.parse_args()
+
+    exchange = StubExchange(args.port, args.seed, args.volatility, args.step, args.filler, args.latency).start()
+    print(f"Stub exchange at {exchange.url} (COINDCX_BASE_URL={exchange.url})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        exchange.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+import logging
+import threading
+import time
+
+import metrics
+from ledger import market_precision
+
+logger = logging.getLogger(__name__)
+
+
+class DepthCache:
+    """Order books per market, fetched at most once per ``ttl`` seconds however many fills read them.
+
+    ``fetch(market)`` returns {'bids': [(price, quantity), ...], 'asks': [...]}
+    in decimals; the cache keeps them in the market's integer ticks, best price
+    first. Concurrent readers of an expired market wait for a single fetch.
+    """
+
+    def __init__(self, fetch, ttl=2.0, max_stale=30.0):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.max_stale = max_stale  # a failed refresh keeps serving a book up to this old
+        self._books = {}  # market -> (fetched_at, book)
+        self._loading = {}  # market -> Event set once the fetch finishes
+        self._lock = threading.Lock()
+
+    def get(self, market):
+        """The market's book in ticks, or None when there is no usable depth"""
+        with self._lock:
+            entry = self._books.get(market)
+            if entry and time.time() - entry[0] < self.ttl:
+                metrics.CACHE_REQUESTS.inc('depth', 'hit')
+                return entry[1]
+            metrics.CACHE_REQUESTS.inc('depth', 'miss')
+            loading = self._loading.get(market)
+            leader = loading is None
+            if leader:
+                loading = self._loading[market] = threading.Event()
+
+        if not leader:
+            loading.wait()
+            return self._cached(market)
+        try:
+            book = self._to_ticks(market, self.fetch(market))
+            with self._lock:
+                self._books[market] = (time.time(), book)
+            return book
+        except Exception as e:
+            logger.error(f"Error fetching {market} depth: {str(e)}")
+            return self._cached(market)
+        finally:
+            with self._lock:
+                del self._loading[market]
+            loading.set()
+
+    def _cached(self, market):
+        with self._lock:
+            entry = self._books.get(market)
+        if entry and time.time() - entry[0] < self.max_stale:
+            return entry[1]
+        return None
+
+    @staticmethod
+    def _to_ticks(market, book):
+        precision = market_precision(market)
+        # Sizes round down so a simulated fill never takes more than was offered
+        side = lambda levels: [(precision.price(price), int(float(quantity) * precision.quantity_scale))
+                               for price, quantity in levels]
+        return {
+            'bids': sorted(side(book.get('bids', [])), reverse=True),
+            'asks': sorted(side(book.get('asks', [])))
+        }
+
+
+class DepthFills:
+    """Fills against one depth snapshot, so orders filled together don't take the same liquidity twice"""
+
+    def __init__(self, book):
+        self.book = book
+        self._taken = {'bids': {}, 'asks': {}}  # level index -> quantity ticks already taken
+
+    def draft(self):
+        """A copy to take from while a batch is validated; ``apply`` it once the batch is committed"""
+        draft = DepthFills(self.book)
+        draft._taken = {side: dict(taken) for side, taken in self._taken.items()}
+        return draft
+
+    def apply(self, draft):
+        """Keep what ``draft`` took, so later orders don't fill against it again"""
+        self._taken = draft._taken
+
+    def take(self, side, quantity, limit=None):
+        """Fill up to ``quantity`` ticks walking the book, buys through the asks and sells through the bids.
+
+        Levels beyond ``limit`` (price ticks) are not touched. Returns
+        (filled quantity, volume-weighted price) in ticks, or (0, None).
+        """
+        book_side = 'asks' if side == 'buy' else 'bids'
+        taken = self._taken[book_side]
+        filled = notional = 0
+        for index, (price, size) in enumerate(self.book[book_side]):
+            if limit is not None and (price > limit if side == 'buy' else price < limit):
+                break
+            available = size - taken.get(index, 0)
+            if available <= 0:
+                continue
+            quantity_here = min(available, quantity - filled)
+            taken[index] = taken.get(index, 0) + quantity_here
+            filled += quantity_here
+            notional += price * quantity_here
+            if filled == quantity:
+                break
+        if not filled:
+            return 0, None
+        return filled, round(notional / filled)
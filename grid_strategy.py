@@ -0,0 +1,121 @@
+from ledger import market_precision
+
+
+class GridStrategy:
+    """A trailing grid: fixed-spacing levels that shift with price once it leaves the band.
+
+    Levels sit on a lattice ``lower_price + (offset + i) * interval``, so after a
+    shift the levels the old and new grid share have exactly the same prices and
+    their orders can stay. The grid re-centers when price moves more than
+    ``trail_levels`` intervals past either edge, at most ``max_recenters`` times
+    (None for no limit).
+    """
+
+    def __init__(self, market, lower_price, upper_price, grid_levels, quantity,
+                 trail_levels=1.0, max_recenters=None, offset=0, recenters=0):
+        if grid_levels < 2 or upper_price <= lower_price:
+            raise ValueError('A grid needs at least 2 levels and upper_price above lower_price')
+        self.market = market
+        self.lower_price = lower_price
+        self.interval = (upper_price - lower_price) / (grid_levels - 1)
+        self.grid_levels = grid_levels
+        self.quantity = quantity
+        self.trail_levels = trail_levels
+        self.max_recenters = max_recenters
+        self.offset = offset
+        self.recenters = recenters
+        self._set_levels()
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['market'], data['lower_price'], data['upper_price'], data['grid_levels'],
+                   data['quantity'], data.get('trail_levels', 1.0), data.get('max_recenters'),
+                   data.get('offset', 0), data.get('recenters', 0))
+
+    def to_dict(self):
+        # upper_price is the original band's, so from_dict rebuilds the same lattice
+        return {
+            'market': self.market,
+            'lower_price': self.lower_price,
+            'upper_price': self.lower_price + self.interval * (self.grid_levels - 1),
+            'grid_levels': self.grid_levels,
+            'quantity': self.quantity,
+            'trail_levels': self.trail_levels,
+            'max_recenters': self.max_recenters,
+            'offset': self.offset,
+            'recenters': self.recenters,
+            'levels': [self._precision.price_float(level) for level in self.levels]
+        }
+
+    def _set_levels(self):
+        self._precision = market_precision(self.market)
+        self.levels = self._lattice(self.offset)
+        # Re-centering triggers outside these bounds (price ticks); checked on every tick
+        trail = self._precision.price(self.interval * self.trail_levels)
+        self._trigger_low = self.levels[0] - trail
+        self._trigger_high = self.levels[-1] + trail
+
+    def _lattice(self, offset):
+        return [self._precision.price(self.lower_price + (offset + i) * self.interval)
+                for i in range(self.grid_levels)]
+
+    def shift_for(self, price):
+        """Levels to shift the grid by so it is centered on ``price`` (ticks); 0 while price is inside the trail"""
+        if self._trigger_low <= price <= self._trigger_high:
+            return 0
+        if self.max_recenters is not None and self.recenters >= self.max_recenters:
+            return 0
+        center = (self.levels[0] + self.levels[-1]) / 2
+        return round((price - center) / self._precision.price(self.interval))
+
+    def recenter(self, shift, price, open_orders):
+        """Move the grid ``shift`` levels and work out which orders change.
+
+        Returns (order ids to cancel, order specs to place). Orders at levels the
+        grid keeps stay untouched unless their counter level changed; levels
+        without an order get one the way /api/grid/start places them. Open
+        orders that are not at a level of the old grid are not the strategy's
+        and are left alone.
+        """
+        old_levels = set(self.levels)
+        self.offset += shift
+        self.recenters += 1
+        self._set_levels()
+        index = {level: i for i, level in enumerate(self.levels)}
+        half_interval = self._precision.price(self.interval) / 2
+
+        cancel, place, covered = [], [], set()
+        for order in open_orders:
+            if order.type != 'limit' or order.price not in old_levels:
+                continue
+            i = index.get(order.price)
+            if i is None:
+                cancel.append(order.id)
+                continue
+            covered.add(order.price)
+            counter = self._counter(i, order.side)
+            if order.counter_price != counter:
+                cancel.append(order.id)
+                place.append(self._spec(order.side, order.price, order.quantity - order.filled, counter))
+
+        for i, level in enumerate(self.levels):
+            if level in covered or abs(level - price) < half_interval:
+                continue
+            side = 'sell' if level > price else 'buy'
+            place.append(self._spec(side, level, self._precision.quantity(self.quantity), self._counter(i, side)))
+        return cancel, place
+
+    def _counter(self, i, side):
+        j = i - 1 if side == 'sell' else i + 1
+        return self.levels[j] if 0 <= j < self.grid_levels else None
+
+    def _spec(self, side, price, quantity, counter):
+        precision = self._precision
+        return {
+            'market': self.market,
+            'side': side,
+            'type': 'limit',
+            'price': precision.price_float(price),
+            'quantity': precision.quantity_float(quantity),
+            'counter_price': precision.price_float(counter) if counter else None
+        }
@@ -0,0 +1,127 @@
+import math
+import threading
+import time
+from collections import deque
+
+
+class StreamingVolatility:
+    """ATR, EWMA volatility and rolling high/low of one market, updated in O(1) per tick.
+
+    Ticks are folded into bars of ``bar_seconds``; the indicators advance each
+    time a bar closes. ATR uses Wilder's smoothing seeded with the simple
+    average of the first ``atr_period`` true ranges, the EWMA variance is of
+    per-bar log returns, and the rolling range over the last ``range_bars``
+    bars is kept with monotonic deques.
+    """
+
+    def __init__(self, bar_seconds=60, atr_period=14, ewma_lambda=0.94, range_bars=60):
+        self.bar_seconds = bar_seconds
+        self.atr_period = atr_period
+        self.ewma_lambda = ewma_lambda
+        self.range_bars = range_bars
+        self.bar = None  # [start, high, low, close] of the bar still forming
+        self.bars = 0
+        self.prev_close = None
+        self.atr = None
+        self.ewma_var = None
+        self._tr_sum = 0.0
+        self._highs = deque()  # (bar index, high), highs decreasing
+        self._lows = deque()  # (bar index, low), lows increasing
+
+    def update(self, timestamp, price):
+        start = timestamp - timestamp % self.bar_seconds
+        bar = self.bar
+        if bar is not None and start == bar[0]:
+            if price > bar[1]:
+                bar[1] = price
+            if price < bar[2]:
+                bar[2] = price
+            bar[3] = price
+            return
+        if bar is not None:
+            if start < bar[0]:
+                return  # out of order
+            self._close_bar()
+        self.bar = [start, price, price, price]
+
+    def _close_bar(self):
+        _, high, low, close = self.bar
+        prev = self.prev_close
+        if prev is None:
+            true_range = high - low
+        else:
+            true_range = max(high - low, abs(high - prev), abs(low - prev))
+            ret = math.log(close / prev)
+            if self.ewma_var is None:
+                self.ewma_var = ret * ret
+            else:
+                self.ewma_var = self.ewma_lambda * self.ewma_var + (1 - self.ewma_lambda) * ret * ret
+
+        if self.atr is not None:
+            self.atr += (true_range - self.atr) / self.atr_period
+        else:
+            self._tr_sum += true_range
+            if self.bars + 1 >= self.atr_period:
+                self.atr = self._tr_sum / self.atr_period
+
+        index = self.bars
+        while self._highs and self._highs[-1][1] <= high:
+            self._highs.pop()
+        self._highs.append((index, high))
+        while self._lows and self._lows[-1][1] >= low:
+            self._lows.pop()
+        self._lows.append((index, low))
+        oldest = index - self.range_bars
+        if self._highs[0][0] <= oldest:
+            self._highs.popleft()
+        if self._lows[0][0] <= oldest:
+            self._lows.popleft()
+
+        self.prev_close = close
+        self.bars += 1
+
+    def snapshot(self):
+        return {
+            'ready': self.atr is not None and self.ewma_var is not None,
+            'bars': self.bars,
+            'bar_seconds': self.bar_seconds,
+            'atr': self.atr,
+            'ewma_volatility': math.sqrt(self.ewma_var) if self.ewma_var is not None else None,
+            'range_high': self._highs[0][1] if self._highs else None,
+            'range_low': self._lows[0][1] if self._lows else None
+        }
+
+
+class VolatilityTracker:
+    """StreamingVolatility for each market, fed from ticker snapshots"""
+
+    def __init__(self, markets=None, **options):
+        self.markets = set(markets) if markets else None  # None tracks every market in the ticker
+        self.options = options
+        self._indicators = {}
+        self._lock = threading.Lock()
+
+    def on_ticker(self, snapshot, timestamp=None):
+        timestamp = timestamp or time.time()
+        markets = self.markets if self.markets is not None else snapshot.keys()
+        with self._lock:
+            for market in markets:
+                ticker = snapshot.get(market)
+                if not ticker:
+                    continue
+                try:
+                    price = float(ticker['last_price'])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                indicator = self._indicators.get(market)
+                if indicator is None:
+                    indicator = self._indicators[market] = StreamingVolatility(**self.options)
+                indicator.update(timestamp, price)
+
+    def get(self, market):
+        """Current indicator values for ``market``; 'ready' is false until enough bars have closed"""
+        with self._lock:
+            indicator = self._indicators.get(market)
+            if indicator is None:
+                return StreamingVolatility(**self.options).snapshot()
+            return indicator.snapshot()
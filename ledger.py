@@ -0,0 +1,200 @@
+QUOTE_ASSET = 'USDT'
+# Quote amounts are price * quantity, so this must cover price + quantity decimals of every market
+QUOTE_DECIMALS = 10
+QUOTE_SCALE = 10 ** QUOTE_DECIMALS
+
+# market -> (price decimals, quantity decimals)
+MARKET_PRECISION = {
+    'OMUSDT': (4, 6),
+    'ETHUSDT': (2, 6),
+    'BNBUSDT': (2, 6),
+    'XRPUSDT': (4, 4),
+    'SOLUSDT': (2, 6)
+}
+DEFAULT_PRECISION = (6, 4)
+
+
+class Precision:
+    """Converts a market's prices and quantities to integer ticks and back.
+
+    Prices are held in units of 10**-price_decimals, quantities (and balances of
+    the base asset) in 10**-quantity_decimals and quote amounts in
+    10**-QUOTE_DECIMALS, so price * quantity is exact in quote ticks.
+    """
+
+    __slots__ = ('market', 'base_asset', 'price_scale', 'quantity_scale', 'value_factor')
+
+    def __init__(self, market, price_decimals, quantity_decimals):
+        if price_decimals + quantity_decimals > QUOTE_DECIMALS:
+            raise ValueError(f"{market} precision exceeds {QUOTE_DECIMALS} quote decimals")
+        self.market = market
+        self.base_asset = market.replace(QUOTE_ASSET, '')
+        self.price_scale = 10 ** price_decimals
+        self.quantity_scale = 10 ** quantity_decimals
+        self.value_factor = 10 ** (QUOTE_DECIMALS - price_decimals - quantity_decimals)
+
+    def price(self, price):
+        return round(float(price) * self.price_scale)
+
+    def quantity(self, quantity):
+        return round(float(quantity) * self.quantity_scale)
+
+    def value(self, price, quantity):
+        """Quote ticks of ``quantity`` ticks at ``price`` ticks; exact"""
+        return price * quantity * self.value_factor
+
+    def price_float(self, price):
+        return price / self.price_scale
+
+    def quantity_float(self, quantity):
+        return quantity / self.quantity_scale
+
+
+_precisions = {}
+
+
+def market_precision(market):
+    precision = _precisions.get(market)
+    if precision is None:
+        precision = _precisions[market] = Precision(market, *MARKET_PRECISION.get(market, DEFAULT_PRECISION))
+    return precision
+
+
+def asset_scale(asset):
+    if asset == QUOTE_ASSET:
+        return QUOTE_SCALE
+    return market_precision(asset + QUOTE_ASSET).quantity_scale
+
+
+def to_ticks(amount, asset):
+    # Persisted amounts are decimals; rounding to the asset's tick also drops float dust like 7.1e-15
+    return round(float(amount) * asset_scale(asset))
+
+
+def from_ticks(ticks, asset):
+    return ticks / asset_scale(asset)
+
+
+def balances_to_ticks(balances):
+    return {asset: to_ticks(amount, asset) for asset, amount in balances.items()}
+
+
+def balances_from_ticks(balances):
+    return {asset: from_ticks(ticks, asset) for asset, ticks in balances.items()}
+
+
+# Statuses of limit orders still resting in the book
+RESTING = ('OPEN', 'PARTIALLY_FILLED')
+
+
+class Order:
+    """An order; ``filled`` is the quantity executed so far while it is PARTIALLY_FILLED, or before a market order EXPIRED"""
+
+    __slots__ = ('id', 'market', 'side', 'type', 'price', 'quantity', 'status', 'timestamp', 'counter_price', 'filled')
+
+    def __init__(self, id, market, side, type, price, quantity, status, timestamp, counter_price=None, filled=0):
+        self.id = id
+        self.market = market
+        self.side = side
+        self.type = type
+        self.price = price
+        self.quantity = quantity
+        self.status = status
+        self.timestamp = timestamp
+        self.counter_price = counter_price
+        self.filled = filled
+
+    @classmethod
+    def from_dict(cls, data):
+        precision = market_precision(data['market'])
+        counter_price = data.get('counter_price')
+        return cls(
+            data['id'], data['market'], data['side'], data.get('type', 'market'),
+            precision.price(data['price']), precision.quantity(data['quantity']),
+            data['status'], data.get('timestamp'),
+            precision.price(counter_price) if counter_price else None,
+            precision.quantity(data.get('filled_quantity', 0))
+        )
+
+    def to_dict(self):
+        precision = market_precision(self.market)
+        data = {
+            'id': self.id,
+            'market': self.market,
+            'side': self.side,
+            'type': self.type,
+            'price': precision.price_float(self.price),
+            'quantity': precision.quantity_float(self.quantity),
+            'status': self.status,
+            'timestamp': self.timestamp
+        }
+        if self.counter_price:
+            data['counter_price'] = precision.price_float(self.counter_price)
+        if self.filled:
+            data['filled_quantity'] = precision.quantity_float(self.filled)
+        return data
+
+
+class Trade:
+    """A fill. ``value`` is in quote ticks; for sells ``cost`` is the position
+    cost it closed and ``realized_pnl`` the difference, both set when the trade
+    is applied to the account."""
+
+    __slots__ = ('order_id', 'market', 'side', 'price', 'quantity', 'timestamp', 'value', 'cost', 'realized_pnl')
+
+    def __init__(self, order_id, market, side, price, quantity, timestamp):
+        self.order_id = order_id
+        self.market = market
+        self.side = side
+        self.price = price
+        self.quantity = quantity
+        self.timestamp = timestamp
+        self.value = market_precision(market).value(price, quantity)
+        self.cost = None
+        self.realized_pnl = None
+
+    @classmethod
+    def from_dict(cls, data):
+        precision = market_precision(data['market'])
+        return cls(data['order_id'], data['market'], data['side'], precision.price(data['price']),
+                   precision.quantity(data['quantity']), data.get('timestamp'))
+
+    def to_dict(self):
+        precision = market_precision(self.market)
+        quantity = precision.quantity_float(self.quantity)
+        data = {
+            'order_id': self.order_id,
+            'market': self.market,
+            'side': self.side,
+            'price': precision.price_float(self.price),
+            'quantity': quantity,
+            'timestamp': self.timestamp,
+            'value': self.value / QUOTE_SCALE
+        }
+        if self.cost is not None:
+            data['entry_price'] = self.cost / QUOTE_SCALE / quantity if quantity else 0
+            data['realized_pnl'] = self.realized_pnl / QUOTE_SCALE
+        return data
+
+
+def encode_record(record):
+    """Journal/API form of an account record: plain dicts with decimal amounts"""
+    op = record['op']
+    if op == 'order':
+        return {'op': op, 'order': record['order'].to_dict()}
+    if op == 'trade':
+        return {'op': op, 'trade': record['trade'].to_dict()}
+    if op in ('balances', 'reset'):
+        return {'op': op, 'balances': balances_from_ticks(record['balances'])}
+    return dict(record)
+
+
+def decode_record(record):
+    op = record['op']
+    if op == 'order':
+        return {'op': op, 'order': Order.from_dict(record['order'])}
+    if op == 'trade':
+        return {'op': op, 'trade': Trade.from_dict(record['trade'])}
+    if op in ('balances', 'reset'):
+        return {'op': op, 'balances': balances_to_ticks(record['balances'])}
+    return record
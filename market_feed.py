@@ -0,0 +1,269 @@
+import logging
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'GRIDFEED\x01'
+# Records: a market name gets a 2-byte index the first time it is seen, and a
+# frame holds the tickers that changed since the previous frame.
+MARKET = struct.Struct('<BHB')  # kind, market index, name length; name bytes follow
+FRAME = struct.Struct('<BdH')  # kind, timestamp, tickers; that many TICKER entries follow
+TICKER = struct.Struct('<Hdddd')  # market index, last_price, bid, ask, volume (NaN when missing)
+KIND_MARKET = 1
+KIND_FRAME = 2
+FIELDS = ('last_price', 'bid', 'ask', 'volume')
+
+
+def _value(ticker, field):
+    try:
+        value = ticker.get(field)
+        return float(value) if value is not None else math.nan
+    except (TypeError, ValueError):
+        return math.nan
+
+
+class FeedReader:
+    """Reads a recorded feed through a read-only memory map.
+
+    Iterating yields (timestamp, snapshot) per recorded refresh, with snapshots
+    shaped like MarketData's ({market: ticker}). A record cut short by a crash
+    ends the feed; ``valid_length`` is where it starts.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.markets = []
+        self.valid_length = 0
+        self.frames = 0
+        self.start = self.end = None
+        self._scan()
+
+    def _open(self):
+        with open(self.path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _scan(self):
+        """Index the market names and find the frame count and time span without building snapshots"""
+        buffer = self._open()
+        if buffer is None:
+            return
+        with buffer:
+            for kind, offset, end, payload in self._records(buffer):
+                if kind == KIND_MARKET:
+                    self.markets.append(payload)
+                else:
+                    self.frames += 1
+                    self.end = payload[0]
+                    if self.start is None:
+                        self.start = payload[0]
+                self.valid_length = end
+
+    def _records(self, buffer):
+        """(kind, start offset, end offset, name or (timestamp, count)) of each complete record"""
+        size = len(buffer)
+        if size < len(MAGIC) or buffer[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{self.path} is not a recorded market feed")
+        offset = len(MAGIC)
+        while offset < size:
+            kind = buffer[offset]
+            if kind == KIND_MARKET:
+                if offset + MARKET.size > size:
+                    return
+                _, _, length = MARKET.unpack_from(buffer, offset)
+                end = offset + MARKET.size + length
+                if end > size:
+                    return
+                yield kind, offset, end, buffer[offset + MARKET.size:end].decode()
+            elif kind == KIND_FRAME:
+                if offset + FRAME.size > size:
+                    return
+                _, timestamp, count = FRAME.unpack_from(buffer, offset)
+                end = offset + FRAME.size + count * TICKER.size
+                if end > size:
+                    return
+                yield kind, offset, end, (timestamp, count)
+            else:
+                logger.error(f"Corrupt record at byte {offset} of {self.path}; feed ends there")
+                return
+            offset = end
+
+    def __len__(self):
+        return self.frames
+
+    def __iter__(self):
+        buffer = self._open()
+        if buffer is None:
+            return
+        with buffer:
+            markets = []
+            snapshot = {}
+            for kind, offset, end, payload in self._records(buffer):
+                if end > self.valid_length:
+                    return  # appended after this reader scanned the file
+                if kind == KIND_MARKET:
+                    markets.append(payload)
+                    continue
+                timestamp, count = payload
+                snapshot = dict(snapshot)
+                position = offset + FRAME.size
+                for _ in range(count):
+                    index, *values = TICKER.unpack_from(buffer, position)
+                    position += TICKER.size
+                    ticker = {'market': markets[index]}
+                    for field, value in zip(FIELDS, values):
+                        ticker[field] = None if math.isnan(value) else value
+                    snapshot[markets[index]] = ticker
+                yield timestamp, snapshot
+
+
+class FeedRecorder:
+    """Appends every ticker snapshot it is given to a compact binary file.
+
+    Subscribe ``on_ticker`` to MarketData. Only tickers whose price, bid, ask
+    or volume changed since the previous frame are written, so a refresh of
+    hundreds of mostly idle markets costs a few dozen bytes. Recording into an
+    existing file continues it, first dropping a record cut short by a crash.
+    """
+
+    def __init__(self, path, markets=None):
+        self.path = path
+        self.markets = set(markets) if markets else None  # None records every market in the ticker
+        self._index = {}
+        self._last = {}  # market -> field values last written, as received
+        self._lock = threading.Lock()
+        valid_length = 0
+        if os.path.exists(path) and os.path.getsize(path):
+            reader = FeedReader(path)
+            self._index = {market: i for i, market in enumerate(reader.markets)}
+            valid_length = reader.valid_length
+        self._file = open(path, 'r+b' if valid_length else 'wb')
+        if valid_length:
+            self._file.truncate(valid_length)
+            self._file.seek(valid_length)
+        else:
+            self._file.write(MAGIC)
+            self._file.flush()
+
+    def on_ticker(self, snapshot, timestamp=None):
+        timestamp = timestamp or time.time()
+        with self._lock:
+            chunks, tickers = [], []
+            markets = self.markets if self.markets is not None else snapshot.keys()
+            for market in markets:
+                ticker = snapshot.get(market)
+                if not ticker:
+                    continue
+                raw = tuple(ticker.get(field) for field in FIELDS)
+                if self._last.get(market) == raw:
+                    continue
+                index = self._index.get(market)
+                if index is None:
+                    index = self._index[market] = len(self._index)
+                    name = market.encode()
+                    chunks.append(MARKET.pack(KIND_MARKET, index, len(name)) + name)
+                tickers.append(TICKER.pack(index, *(_value(ticker, field) for field in FIELDS)))
+                self._last[market] = raw
+            chunks.append(FRAME.pack(KIND_FRAME, timestamp, len(tickers)))
+            chunks.extend(tickers)
+            # One write per refresh, so a crash loses at most the record being written
+            self._file.write(b''.join(chunks))
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class FeedReplay:
+    """Plays a recorded feed back in place of MarketData's PriceAggregator.
+
+    ``fetch()`` returns the next recorded snapshot with its recorded time,
+    sleeping so that frames come ``speed`` times as fast as they were recorded;
+    ``speed=None`` replays as fast as the listeners keep up. Use it with a
+    MarketData ``refresh_interval`` of 0. A replay created ``paused`` serves
+    only the first frame until ``play()``, so grids can be set up at the feed's
+    opening prices. While paused or once the feed is exhausted fetch keeps
+    returning the current frame, which MarketData ignores.
+    """
+
+    method = 'replay'
+
+    def __init__(self, path, speed=1.0, paused=False, idle_interval=1.0):
+        self.reader = FeedReader(path)
+        self.speed = self._check_speed(speed)
+        self.idle_interval = idle_interval
+        self.frames = 0
+        self.finished = threading.Event()
+        self._playing = threading.Event()
+        if not paused:
+            self._playing.set()
+        self._frames = iter(self.reader)
+        self._current = (None, None)
+        self._anchor = None  # (wall clock, feed time) that pacing counts from
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _check_speed(speed):
+        if speed is not None and speed <= 0:
+            raise ValueError('Replay speed must be positive')
+        return speed
+
+    def play(self, speed=False):
+        """Resume the replay, optionally at a new ``speed`` (None for as fast as possible)"""
+        if speed is not False:
+            self.speed = self._check_speed(speed)
+        self._anchor = None
+        self._playing.set()
+
+    def pause(self):
+        self._playing.clear()
+
+    def fetch(self):
+        # MarketData's first get_snapshot can race its refresher thread; each frame is served once
+        with self._lock:
+            return self._next()
+
+    def _next(self):
+        if self.finished.is_set() or (self.frames and not self._playing.wait(self.idle_interval)):
+            if self.finished.is_set():
+                time.sleep(self.idle_interval)
+            return self._current
+        frame = next(self._frames, None)
+        if frame is None:
+            logger.info(f"Replay of {self.reader.path} finished after {self.frames} frames")
+            self.finished.set()
+            return self._current
+        timestamp, snapshot = frame
+        if self._anchor is None:
+            self._anchor = (time.time(), self._current[1] if self._current[1] is not None else timestamp)
+        if self.speed is not None:
+            delay = self._anchor[0] + (timestamp - self._anchor[1]) / self.speed - time.time()
+            if delay > 0:
+                time.sleep(delay)
+        self.frames += 1
+        self._current = (snapshot, timestamp)
+        return self._current
+
+    def fetch_depth(self, market):
+        raise LookupError('Recorded feeds have no order book depth')
+
+    def status(self):
+        return [{
+            'name': f"replay:{self.reader.path}",
+            'healthy': True,
+            'playing': self._playing.is_set(),
+            'finished': self.finished.is_set(),
+            'speed': self.speed,
+            'frames': self.frames,
+            'total_frames': len(self.reader),
+            'feed_time': self._current[1],
+            'feed_start': self.reader.start,
+            'feed_end': self.reader.end
+        }]
@@ -0,0 +1,168 @@
+import argparse
+import json
+import logging
+
+import numpy as np
+
+import backtest
+
+logger = logging.getLogger(__name__)
+
+MODELS = ('gbm', 'bootstrap')
+PERCENTILES = (1, 5, 25, 50, 75, 95, 99)
+# simulate_grid keeps about this many (paths, steps) float64 arrays alive at once
+ARRAYS_PER_PATH = 24
+DEFAULT_CHUNK_BYTES = 256 * 1024 * 1024
+
+
+def log_returns(candles):
+    """Close-to-close log returns of OHLCV candles, for bootstrapping"""
+    closes = candles['close'].to_numpy(dtype=np.float64)
+    closes = closes[closes > 0]
+    return np.diff(np.log(closes))
+
+
+def gbm_paths(rng, start_price, paths, steps, volatility, drift=0.0):
+    """Geometric Brownian motion; ``volatility`` and ``drift`` are per step. Returns (paths, steps + 1) prices"""
+    increments = rng.standard_normal((paths, steps))
+    increments *= volatility
+    increments += drift - 0.5 * volatility ** 2
+    return _prices(start_price, increments)
+
+
+def bootstrap_paths(rng, start_price, paths, steps, returns):
+    """Paths of log returns drawn with replacement from ``returns``. Returns (paths, steps + 1) prices"""
+    return _prices(start_price, returns[rng.integers(0, len(returns), size=(paths, steps))])
+
+
+def _prices(start_price, increments):
+    np.cumsum(increments, axis=1, out=increments)
+    np.exp(increments, out=increments)
+    increments *= start_price
+    return np.concatenate((np.full((len(increments), 1), float(start_price)), increments), axis=1)
+
+
+def distribution(values):
+    percentiles = np.percentile(values, PERCENTILES)
+    result = {
+        'mean': float(values.mean()),
+        'std': float(values.std()),
+        'min': float(values.min()),
+        'max': float(values.max())
+    }
+    result.update({f"p{p}": float(value) for p, value in zip(PERCENTILES, percentiles)})
+    return result
+
+
+def stress_test(config, start_price, paths=10000, steps=1440, model='gbm', volatility=None, drift=0.0,
+                returns=None, initial_balance=1000.0, fee_rate=backtest.DEFAULT_FEE_RATE, seed=None,
+                chunk_size=None, bins=20):
+    """Run a grid configuration over many synthetic price paths and return the spread of outcomes.
+
+    Paths are generated and simulated ``chunk_size`` at a time as one
+    (paths, steps) batch through backtest.simulate_grid; by default a chunk is
+    sized to stay within about 256MB. 'gbm' needs the per-step ``volatility``
+    (and optionally ``drift``); 'bootstrap' resamples the log ``returns`` of a
+    stored history, one return per step. The same ``seed`` gives the same result.
+    """
+    if model not in MODELS:
+        raise ValueError(f"Unknown model: {model}")
+    if model == 'gbm' and not volatility or model == 'bootstrap' and (returns is None or not len(returns)):
+        raise ValueError('gbm needs a volatility and bootstrap needs returns')
+    if paths < 1 or steps < 1:
+        raise ValueError('paths and steps must be positive')
+    if int(config['grid_levels']) < 2:
+        raise ValueError('A grid needs at least 2 levels')
+
+    levels = backtest.grid_levels(config['lower_price'], config['upper_price'], config['grid_levels'])
+    quantity = float(config['quantity_per_grid'])
+    rng = np.random.default_rng(seed)
+    chunk_size = chunk_size or max(1, DEFAULT_CHUNK_BYTES // (ARRAYS_PER_PATH * 8 * (steps + 1)))
+
+    metrics = {name: np.empty(paths) for name in (
+        'total_pnl', 'realized_pnl', 'max_drawdown', 'max_drawdown_percent', 'fills', 'out_of_band', 'end_price')}
+    for start in range(0, paths, chunk_size):
+        count = min(chunk_size, paths - start)
+        if model == 'gbm':
+            batch = gbm_paths(rng, start_price, count, steps, volatility, drift)
+        else:
+            batch = bootstrap_paths(rng, start_price, count, steps, returns)
+        simulation = backtest.simulate_grid(batch, levels, quantity, initial_balance, fee_rate)
+
+        equity = simulation['equity']
+        running_max = np.maximum.accumulate(equity, axis=1)
+        drawdown = running_max - equity
+        chunk = slice(start, start + count)
+        metrics['total_pnl'][chunk] = equity[:, -1] - initial_balance
+        metrics['realized_pnl'][chunk] = simulation['realized'].sum(axis=1)
+        metrics['max_drawdown'][chunk] = drawdown.max(axis=1)
+        metrics['max_drawdown_percent'][chunk] = (drawdown / running_max).max(axis=1) * 100
+        metrics['fills'][chunk] = (simulation['sells'] + simulation['buys']).sum(axis=1)
+        metrics['out_of_band'][chunk] = ((batch < levels[0]) | (batch > levels[-1])).mean(axis=1)
+        metrics['end_price'][chunk] = batch[:, -1]
+
+    counts, edges = np.histogram(metrics['total_pnl'], bins=bins)
+    result = {name: distribution(values) for name, values in metrics.items()}
+    result.update({
+        'model': model,
+        'paths': paths,
+        'steps': steps,
+        'start_price': float(start_price),
+        'probability_of_loss': float((metrics['total_pnl'] < 0).mean()),
+        'pnl_histogram': {'counts': counts.tolist(), 'edges': edges.tolist()},
+        'config': {
+            'lower_price': float(levels[0]),
+            'upper_price': float(levels[-1]),
+            'grid_levels': len(levels),
+            'quantity_per_grid': quantity
+        }
+    })
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stress-test a grid configuration over Monte Carlo price paths')
+    parser.add_argument('path', nargs='?', help='CSV or Parquet OHLCV file: the start price, and the returns to '
+                                                'bootstrap or the volatility for gbm')
+    parser.add_argument('--model', choices=MODELS, default='bootstrap')
+    parser.add_argument('--price', type=float, help='start price (default: the last close of the file)')
+    parser.add_argument('--volatility', type=float, help='per-step volatility for gbm (default: from the file)')
+    parser.add_argument('--drift', type=float, default=0.0, help='per-step drift for gbm')
+    parser.add_argument('--paths', type=int, default=10000)
+    parser.add_argument('--steps', type=int, default=1440, help='steps per path, one per candle of the file')
+    parser.add_argument('--lower', type=float)
+    parser.add_argument('--upper', type=float)
+    parser.add_argument('--levels', type=int, default=6)
+    parser.add_argument('--quantity', type=float)
+    parser.add_argument('--band', type=float, default=0.003, help='half-width of the default grid as a fraction of price')
+    parser.add_argument('--balance', type=float, default=1000.0)
+    parser.add_argument('--fee', type=float, default=backtest.DEFAULT_FEE_RATE)
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    returns = None
+    price = args.price
+    if args.path:
+        candles = backtest.load_ohlcv(args.path)
+        returns = log_returns(candles)
+        price = price or float(candles['close'].iloc[-1])
+    if price is None:
+        parser.error('give a data file or --price')
+    volatility = args.volatility or (float(returns.std()) if returns is not None else None)
+
+    config = backtest.default_grid(price, args.balance, args.band, args.levels)
+    if args.lower is not None:
+        config['lower_price'] = args.lower
+    if args.upper is not None:
+        config['upper_price'] = args.upper
+    if args.quantity is not None:
+        config['quantity_per_grid'] = args.quantity
+
+    result = stress_test(config, price, paths=args.paths, steps=args.steps, model=args.model, volatility=volatility,
+                         drift=args.drift, returns=returns, initial_balance=args.balance, fee_rate=args.fee,
+                         seed=args.seed)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+import argparse
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import numpy as np
+
+import backtest
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEVELS = (4, 6, 8, 10, 12, 16, 20)
+DEFAULT_BANDS = (0.002, 0.003, 0.005, 0.0075, 0.01, 0.015, 0.02)
+DEFAULT_FRACTIONS = (0.5, 0.65, 0.8)
+
+# Objective -> (result key, higher is better)
+OBJECTIVES = {
+    'pnl': ('total_pnl', True),
+    'sharpe': ('sharpe', True),
+    'drawdown': ('max_drawdown_percent', False)
+}
+
+# Set in each worker by _attach_path
+_worker = {}
+
+
+def _attach_path(name, length, initial_balance, fee_rate, periods_per_year):
+    """Pool initializer: map the shared price path instead of receiving a pickled copy per task"""
+    shm = shared_memory.SharedMemory(name=name)
+    _worker['shm'] = shm
+    _worker['path'] = np.ndarray((length,), dtype=np.float64, buffer=shm.buf)
+    _worker['initial_balance'] = initial_balance
+    _worker['fee_rate'] = fee_rate
+    _worker['periods_per_year'] = periods_per_year
+
+
+def evaluate(path, levels, band, fraction, initial_balance, fee_rate, periods_per_year):
+    """Backtest one grid centred on the first price of ``path``"""
+    start = path[0]
+    grid = backtest.grid_levels(start * (1 - band), start * (1 + band), levels)
+    quantity = initial_balance * fraction / (levels * start)
+    simulation = backtest.simulate_grid(path, grid, quantity, initial_balance, fee_rate)
+    result = backtest.summarize(path, simulation, initial_balance, periods_per_year)
+    result.update({'grid_levels': levels, 'band': band, 'capital_fraction': fraction})
+    return result
+
+
+def _evaluate_chunk(combinations):
+    return [
+        evaluate(_worker['path'], levels, band, fraction, _worker['initial_balance'],
+                 _worker['fee_rate'], _worker['periods_per_year'])
+        for levels, band, fraction in combinations
+    ]
+
+
+def rank(results, objective='pnl'):
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Unknown objective: {objective}")
+    key, descending = OBJECTIVES[objective]
+    return sorted(results, key=lambda result: result[key], reverse=descending)
+
+
+def sweep(candles, levels=DEFAULT_LEVELS, bands=DEFAULT_BANDS, fractions=DEFAULT_FRACTIONS,
+          objective='pnl', initial_balance=1000.0, fee_rate=backtest.DEFAULT_FEE_RATE, workers=None):
+    """Backtest every (levels, band, capital fraction) combination and rank the results.
+
+    The tick path is copied once into shared memory; workers attach to it by name
+    and only the small parameter tuples and result dicts cross process boundaries.
+    """
+    combinations = [(int(n), float(b), float(f)) for n, b, f in itertools.product(levels, bands, fractions) if int(n) >= 2]
+    if not combinations:
+        raise ValueError('No parameter combinations to evaluate')
+
+    path = backtest.price_path(candles)
+    periods_per_year = backtest.periods_per_year(candles)
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1 or len(combinations) == 1:
+        results = [evaluate(path, n, b, f, initial_balance, fee_rate, periods_per_year) for n, b, f in combinations]
+        return rank(results, objective)
+
+    shm = shared_memory.SharedMemory(create=True, size=path.nbytes)
+    try:
+        np.ndarray(path.shape, dtype=np.float64, buffer=shm.buf)[:] = path
+        # A few chunks per worker keeps the pool busy without paying per-task overhead
+        chunk_size = max(1, len(combinations) // (workers * 4))
+        chunks = [combinations[i:i + chunk_size] for i in range(0, len(combinations), chunk_size)]
+        # spawn rather than fork: sweeps can be started from a threaded web server
+        with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_attach_path,
+                initargs=(shm.name, len(path), initial_balance, fee_rate, periods_per_year)) as pool:
+            results = [result for chunk in pool.map(_evaluate_chunk, chunks) for result in chunk]
+    finally:
+        shm.close()
+        shm.unlink()
+    return rank(results, objective)
+
+
+class SweepCache:
+    """Runs a sweep over a data file in the background and keeps the ranking until the file changes.
+
+    The sweep runs as this module's CLI in a separate process, so its spawned
+    workers import only the optimizer and never the web app that asked for it.
+    """
+
+    def __init__(self, objective='pnl', **sweep_options):
+        self.objective = objective
+        self.sweep_options = sweep_options
+        self._results = {}  # (path, mtime) -> ranked results
+        self._running = set()
+        self._lock = threading.Lock()
+
+    def best(self, path):
+        """Best result for ``path``, or None while the sweep is still running"""
+        path = Path(path).resolve()
+        key = (str(path), path.stat().st_mtime)
+        with self._lock:
+            if key in self._results:
+                return self._results[key][0] if self._results[key] else None
+            if key not in self._running:
+                self._running.add(key)
+                threading.Thread(target=self._run, args=(key,), name='grid-sweep', daemon=True).start()
+        return None
+
+    def _run(self, key):
+        try:
+            completed = subprocess.run(self._command(key[0]), capture_output=True, text=True, check=True)
+            results = json.loads(completed.stdout)
+            with self._lock:
+                self._results = {key: results}
+            logger.info(f"Grid sweep over {key[0]} finished with {len(results)} results")
+        except subprocess.CalledProcessError as e:
+            logger.error(f"Error running grid sweep: {e.stderr.strip() or e}")
+            with self._lock:
+                self._results = {key: []}
+        except Exception as e:
+            logger.error(f"Error running grid sweep: {str(e)}")
+            with self._lock:
+                self._results = {key: []}
+        finally:
+            with self._lock:
+                self._running.discard(key)
+
+
+    def _command(self, path):
+        command = [sys.executable, str(Path(__file__).resolve()), path, '--objective', self.objective, '--top', '0']
+        for option, flag in (('initial_balance', '--balance'), ('fee_rate', '--fee'), ('workers', '--workers')):
+            if self.sweep_options.get(option) is not None:
+                command += [flag, str(self.sweep_options[option])]
+        for option in ('levels', 'bands', 'fractions'):
+            if self.sweep_options.get(option) is not None:
+                command += [f"--{option}", ','.join(map(str, self.sweep_options[option]))]
+        return command
+
+
+def _parse_list(value, cast):
+    return [cast(item) for item in value.split(',') if item.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sweep grid parameters over OHLCV candles')
+    parser.add_argument('path', help='CSV or Parquet OHLCV file')
+    parser.add_argument('--levels', default=','.join(map(str, DEFAULT_LEVELS)))
+    parser.add_argument('--bands', default=','.join(map(str, DEFAULT_BANDS)), help='grid half-widths as fractions of price')
+    parser.add_argument('--fractions', default=','.join(map(str, DEFAULT_FRACTIONS)), help='share of the balance put into the grid')
+    parser.add_argument('--objective', choices=sorted(OBJECTIVES), default='pnl')
+    parser.add_argument('--balance', type=float, default=1000.0)
+    parser.add_argument('--fee', type=float, default=backtest.DEFAULT_FEE_RATE)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--top', type=int, default=10, help='results to print (0 for all)')
+    args = parser.parse_args()
+
+    results = sweep(
+        backtest.load_ohlcv(args.path),
+        levels=_parse_list(args.levels, int),
+        bands=_parse_list(args.bands, float),
+        fractions=_parse_list(args.fractions, float),
+        objective=args.objective,
+        initial_balance=args.balance,
+        fee_rate=args.fee,
+        workers=args.workers
+    )
+    print(json.dumps(results[:args.top] if args.top else results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+from bisect import bisect_left, insort
+from itertools import count
+
+
+class OrderBook:
+    """Open orders for one market, each side kept sorted with its best price last.
+
+    Bids are keyed by (price, -arrival) and asks by (-price, -arrival), so on
+    both sides the orders a trade crosses form a tail of the list: finding them
+    is a bisect and removing them only shifts the few entries behind them.
+    Walking that tail backwards gives the best price first and, within a price,
+    the oldest order first.
+    """
+
+    def __init__(self, market):
+        self.market = market
+        self.bids = []  # (price, -arrival, order_id), best (highest) bid last
+        self.asks = []  # (-price, -arrival, order_id), best (lowest) ask last
+        self._keys = {}  # order_id -> (side list, key)
+        self._arrival = count()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, order_id):
+        return order_id in self._keys
+
+    def add(self, order):
+        if order.id in self._keys:
+            return
+        if order.side == 'buy':
+            levels, key = self.bids, (order.price, -next(self._arrival), order.id)
+        else:
+            levels, key = self.asks, (-order.price, -next(self._arrival), order.id)
+        insort(levels, key)
+        self._keys[order.id] = (levels, key)
+
+    def remove(self, order_id):
+        entry = self._keys.pop(order_id, None)
+        if entry is None:
+            return False
+        levels, key = entry
+        del levels[bisect_left(levels, key)]
+        return True
+
+    def crossed(self, price):
+        """Ids of the orders a trade at ``price`` (in the same ticks as the orders) fills: bids at or above it, asks at or below it.
+
+        Best price first, and first in first out within a price.
+        """
+        bids = self.bids[bisect_left(self.bids, (price,)):]
+        asks = self.asks[bisect_left(self.asks, (-price,)):]
+        return [key[2] for key in reversed(bids)] + [key[2] for key in reversed(asks)]
+
+    def order_ids(self):
+        """Open order ids from the lowest to the highest price, bids before asks"""
+        return [key[2] for key in self.bids] + [key[2] for key in reversed(self.asks)]
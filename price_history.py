@@ -0,0 +1,147 @@
+import threading
+import time
+
+import numpy as np
+
+# resolution -> (seconds per candle, candles kept)
+RESOLUTIONS = {
+    '1s': (1, 3600),
+    '1m': (60, 1440),
+    '5m': (300, 2016),
+    '1h': (3600, 720)
+}
+
+
+class CandleRing:
+    """Fixed-size ring of OHLC candles for one resolution, oldest overwritten first"""
+
+    def __init__(self, seconds, capacity):
+        self.seconds = seconds
+        self.capacity = capacity
+        self.time = np.zeros(capacity, dtype=np.float64)  # candle start, epoch seconds
+        self.ohlc = np.zeros((capacity, 4), dtype=np.float64)
+        self.count = 0
+        self.head = 0  # slot of the newest candle
+
+    def add(self, timestamp, price):
+        start = timestamp - timestamp % self.seconds
+        if self.count and self.time[self.head] == start:
+            row = self.ohlc[self.head]
+            if price > row[1]:
+                row[1] = price
+            if price < row[2]:
+                row[2] = price
+            row[3] = price
+            return
+        if self.count and start < self.time[self.head]:
+            return  # out of order
+        self.head = (self.head + 1) % self.capacity if self.count else 0
+        self.time[self.head] = start
+        self.ohlc[self.head] = price
+        self.count = min(self.count + 1, self.capacity)
+
+    def window(self, start=None, end=None):
+        """(times, ohlc) in chronological order, limited to candles starting in [start, end]"""
+        first = (self.head - self.count + 1) % self.capacity
+        if first + self.count <= self.capacity:
+            times = self.time[first:first + self.count]
+            ohlc = self.ohlc[first:first + self.count]
+        else:
+            order = np.r_[first:self.capacity, 0:self.head + 1]
+            times = self.time[order]
+            ohlc = self.ohlc[order]
+        lo = np.searchsorted(times, start, side='left') if start is not None else 0
+        hi = np.searchsorted(times, end, side='right') if end is not None else len(times)
+        return times[lo:hi].copy(), ohlc[lo:hi].copy()
+
+
+def minmax_buckets(times, ohlc, points):
+    """Merge consecutive candles into ``points`` wider candles (first open, max high, min low, last close)"""
+    if len(times) <= points:
+        return times, ohlc
+    starts = np.linspace(0, len(times), points, endpoint=False).astype(np.int64)
+    ends = np.r_[starts[1:], len(times)] - 1
+    merged = np.column_stack([
+        ohlc[starts, 0],
+        np.maximum.reduceat(ohlc[:, 1], starts),
+        np.minimum.reduceat(ohlc[:, 2], starts),
+        ohlc[ends, 3]
+    ])
+    return times[starts], merged
+
+
+def lttb(times, values, points):
+    """Indices picked by Largest-Triangle-Three-Buckets, keeping the first and last point"""
+    n = len(times)
+    if points >= n or points < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    selected = np.empty(points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for i in range(points - 2):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        # Average of the next bucket is the third triangle corner
+        next_lo, next_hi = hi, max(edges[i + 2] if i + 2 < len(edges) else n, hi + 1)
+        avg_t = times[next_lo:next_hi].mean()
+        avg_v = values[next_lo:next_hi].mean()
+        t, v = times[lo:hi], values[lo:hi]
+        area = np.abs((times[previous] - avg_t) * (v - values[previous])
+                      - (times[previous] - t) * (avg_v - values[previous]))
+        previous = lo + int(area.argmax())
+        selected[i + 1] = previous
+    return selected
+
+
+class PriceHistory:
+    """Candles for each market built from ticker snapshots, at every resolution in RESOLUTIONS.
+
+    Every tick updates the current candle of each resolution in place, so the
+    cost per tick is constant and memory per market is fixed.
+    """
+
+    def __init__(self, markets=None):
+        self.markets = set(markets) if markets else None  # None tracks every market in the ticker
+        self._rings = {}  # market -> {resolution: CandleRing}
+        self._lock = threading.Lock()
+
+    def on_ticker(self, snapshot, timestamp=None):
+        timestamp = timestamp or time.time()
+        markets = self.markets if self.markets is not None else snapshot.keys()
+        with self._lock:
+            for market in markets:
+                ticker = snapshot.get(market)
+                if not ticker:
+                    continue
+                try:
+                    price = float(ticker['last_price'])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                rings = self._rings.get(market)
+                if rings is None:
+                    rings = self._rings[market] = {
+                        resolution: CandleRing(seconds, capacity)
+                        for resolution, (seconds, capacity) in RESOLUTIONS.items()
+                    }
+                for ring in rings.values():
+                    ring.add(timestamp, price)
+
+    def candles(self, market, resolution='1m', start=None, end=None, points=None, method='minmax'):
+        """Candles in [start, end] reduced to at most ``points`` by 'minmax' bucketing or 'lttb' on closes"""
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"Unknown resolution: {resolution}")
+        if method not in ('minmax', 'lttb'):
+            raise ValueError(f"Unknown downsampling method: {method}")
+        with self._lock:
+            rings = self._rings.get(market)
+            if rings is None:
+                return np.zeros(0), np.zeros((0, 4))
+            times, ohlc = rings[resolution].window(start, end)
+        if points and len(times) > points:
+            if method == 'lttb':
+                keep = lttb(times, ohlc[:, 3], points)
+                times, ohlc = times[keep], ohlc[keep]
+            else:
+                times, ohlc = minmax_buckets(times, ohlc, points)
+        return times, ohlc
@@ -0,0 +1,291 @@
+import logging
+import statistics
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+
+import metrics
+from ledger import QUOTE_ASSET
+
+logger = logging.getLogger(__name__)
+
+
+class PriceSource:
+    """One exchange's tickers, with the health bookkeeping the aggregator needs.
+
+    ``fetch()`` returns {market: ticker} where tickers are CoinDCX-shaped dicts
+    with at least 'last_price' and optionally 'bid', 'ask' and 'volume'. After
+    a failure the source is skipped for a backoff that doubles with every
+    consecutive failure, up to ``max_backoff`` seconds. Sources with ``depth``
+    also serve ``fetch_depth(market)``: {'bids': [(price, quantity), ...],
+    'asks': [...]}.
+    """
+
+    depth = False
+
+    def __init__(self, name, timeout=2.0, max_backoff=60.0):
+        self.name = name
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+        self.failures = 0
+        self.retry_at = 0.0
+        self.latency = None  # moving average of successful fetches, seconds
+        self.last_error = None
+
+    def fetch(self):
+        raise NotImplementedError
+
+    def fetch_depth(self, market):
+        raise NotImplementedError
+
+    def healthy(self, now):
+        return now >= self.retry_at
+
+    def record_success(self, latency):
+        self.failures = 0
+        self.retry_at = 0.0
+        self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+
+    def record_failure(self, error, now):
+        self.failures += 1
+        self.last_error = str(error)
+        self.retry_at = now + min(2 ** (self.failures - 1), self.max_backoff)
+
+    def status(self, now):
+        return {
+            'name': self.name,
+            'healthy': self.healthy(now),
+            'failures': self.failures,
+            'latency_ms': round(self.latency * 1000, 1) if self.latency is not None else None,
+            'retry_in': max(self.retry_at - now, 0),
+            'last_error': self.last_error
+        }
+
+
+class HTTPTickerSource(PriceSource):
+    """Any endpoint serving CoinDCX's ticker format: CoinDCX itself or a local stub exchange"""
+
+    def __init__(self, name, url, **options):
+        super().__init__(name, **options)
+        self.url = url
+        self._session = requests.Session()
+
+    def fetch(self):
+        response = self._session.get(self.url, timeout=self.timeout)
+        response.raise_for_status()
+        return {ticker['market']: ticker for ticker in response.json() if 'market' in ticker}
+
+
+class CoinDCXSource(HTTPTickerSource):
+    """CoinDCX tickers, plus order books from its public market data API"""
+
+    depth = True
+
+    def __init__(self, base_url, public_url='https://public.coindcx.com', **options):
+        super().__init__('coindcx', f"{base_url}/exchange/ticker", **options)
+        self.base_url = base_url
+        self.public_url = public_url
+        self._pairs = None  # market ('OMUSDT') -> order book pair ('B-OM_USDT')
+
+    def fetch_depth(self, market):
+        if self._pairs is None:
+            response = self._session.get(f"{self.base_url}/exchange/v1/markets_details", timeout=self.timeout)
+            response.raise_for_status()
+            self._pairs = {item['coindcx_name']: item['pair'] for item in response.json() if 'pair' in item}
+        response = self._session.get(f"{self.public_url}/market_data/orderbook",
+                                     params={'pair': self._pairs[market]}, timeout=self.timeout)
+        response.raise_for_status()
+        book = response.json()
+        # Levels come as {price: quantity}
+        return {side: list(book.get(side, {}).items()) for side in ('bids', 'asks')}
+
+
+class CCXTSource(PriceSource):
+    """Tickers and order books for ``markets`` (e.g. 'OMUSDT') from any exchange ccxt supports"""
+
+    depth = True
+
+    def __init__(self, exchange_id, markets, **options):
+        super().__init__(exchange_id, **options)
+        import ccxt  # slow to import, so only when an exchange is configured
+        self.exchange = getattr(ccxt, exchange_id)({'timeout': int(self.timeout * 1000), 'enableRateLimit': False})
+        self.symbols = {f"{market[:-len(QUOTE_ASSET)]}/{QUOTE_ASSET}": market for market in markets
+                        if market.endswith(QUOTE_ASSET)}
+
+    def fetch(self):
+        tickers = self.exchange.fetch_tickers(list(self.symbols))
+        snapshot = {}
+        for symbol, ticker in tickers.items():
+            market = self.symbols.get(symbol)
+            if market and ticker.get('last') is not None:
+                snapshot[market] = {
+                    'market': market,
+                    'last_price': ticker['last'],
+                    'bid': ticker.get('bid'),
+                    'ask': ticker.get('ask'),
+                    'volume': ticker.get('baseVolume')
+                }
+        return snapshot
+
+    def fetch_depth(self, market):
+        symbol = next(symbol for symbol, name in self.symbols.items() if name == market)
+        book = self.exchange.fetch_order_book(symbol, limit=50)
+        return {side: [(level[0], level[1]) for level in book[side]] for side in ('bids', 'asks')}
+
+
+class PriceAggregator:
+    """Fetches every healthy source concurrently and combines them into one reference price per market.
+
+    A round waits for the first source to answer, then at most ``grace``
+    seconds more for the rest that usually answer within it, so its latency
+    follows the fastest healthy exchange. Sources still running keep going in the background; their
+    result is used by later rounds while it is younger than ``max_age``. A
+    source whose previous fetch is still running is not asked again.
+
+    ``method`` is 'median' (default), 'vwap' (weighted by 24h volume) or 'best'
+    (midpoint of the highest bid and lowest ask across sources).
+    """
+
+    METHODS = ('median', 'vwap', 'best')
+
+    def __init__(self, sources, method='median', grace=0.25, max_age=5.0):
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown aggregation method: {method}")
+        self.sources = list(sources)
+        self.method = method
+        self.grace = grace
+        self.max_age = max_age
+        self._latest = {}  # source name -> (fetched_at, snapshot)
+        self._inflight = {}  # source name -> Future
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(len(self.sources), 1), thread_name_prefix='price-source')
+
+    def fetch(self):
+        """One round; returns (combined snapshot, fetch time of its newest input), or
+        (None, None) when no source has fresh data"""
+        now = time.time()
+        with self._lock:
+            for source in self.sources:
+                if source.name not in self._inflight and source.healthy(now):
+                    self._inflight[source.name] = self._executor.submit(self._fetch_source, source)
+            pending = set(self._inflight.values())
+            # Sources known to take longer than the grace period aren't waited for after the first answer
+            expected = {future for name, future in self._inflight.items()
+                        if self._latency(name) is None or self._latency(name) <= self.grace}
+
+        deadline = now + max((source.timeout for source in self.sources), default=0)
+        # Until one source answers this round, wait for the next one to finish
+        while pending and not self._answered_since(now) and time.time() < deadline:
+            _, pending = wait(pending, timeout=deadline - time.time(), return_when=FIRST_COMPLETED)
+        pending &= expected
+        if pending and self.grace:
+            wait(pending, timeout=self.grace)
+        return self._combine(time.time())
+
+    def _fetch_source(self, source):
+        started = time.time()
+        try:
+            with metrics.upstream(source.name, 'ticker'):
+                snapshot = source.fetch()
+            finished = time.time()
+            with self._lock:
+                self._latest[source.name] = (finished, snapshot)
+                source.record_success(finished - started)
+        except Exception as e:
+            with self._lock:
+                source.record_failure(e, time.time())
+            logger.error(f"Price source {source.name} failed: {str(e)}")
+        finally:
+            with self._lock:
+                self._inflight.pop(source.name, None)
+
+    def _latency(self, name):
+        for source in self.sources:
+            if source.name == name:
+                return source.latency
+
+    def _answered_since(self, since):
+        with self._lock:
+            return any(fetched_at >= since for fetched_at, _ in self._latest.values())
+
+    def _fresh(self, now):
+        with self._lock:
+            return [(fetched_at, snapshot) for fetched_at, snapshot in self._latest.values()
+                    if now - fetched_at <= self.max_age]
+
+    def _combine(self, now):
+        fresh = self._fresh(now)
+        if not fresh:
+            return None, None
+        fetched_at = max(fetched_at for fetched_at, _ in fresh)
+        snapshots = [snapshot for _, snapshot in fresh]
+        if len(snapshots) == 1:
+            return snapshots[0], fetched_at
+
+        combined = {}
+        for market in set().union(*snapshots):
+            tickers = [snapshot[market] for snapshot in snapshots if market in snapshot]
+            prices, weights, bids, asks = [], [], [], []
+            for ticker in tickers:
+                try:
+                    price = float(ticker['last_price'])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                prices.append(price)
+                weights.append(_number(ticker.get('volume')))
+                bids.append(_number(ticker.get('bid')))
+                asks.append(_number(ticker.get('ask')))
+            if not prices:
+                continue
+            price = statistics.median(prices)
+            if self.method == 'vwap' and all(weights) and sum(weights) > 0:
+                price = sum(p * w for p, w in zip(prices, weights)) / sum(weights)
+            elif self.method == 'best' and any(bids) and any(asks):
+                price = (max(b for b in bids if b) + min(a for a in asks if a)) / 2
+            combined[market] = dict(tickers[0], last_price=price, sources=len(prices))
+        return combined, fetched_at
+
+    def fetch_depth(self, market):
+        """Order book from the first healthy source that has one"""
+        now = time.time()
+        error = None
+        for source in self.sources:
+            if source.depth and source.healthy(now):
+                try:
+                    with metrics.upstream(source.name, 'depth'):
+                        return source.fetch_depth(market)
+                except Exception as e:
+                    error = e
+        raise error or LookupError(f"No price source serves {market} depth")
+
+    def status(self):
+        now = time.time()
+        with self._lock:
+            return [source.status(now) for source in self.sources]
+
+
+def _number(value):
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def sources_from_config(config, markets, coindcx_url, coindcx_public_url='https://public.coindcx.com', timeout=2.0):
+    """Sources from a comma-separated list: 'coindcx', 'ccxt:<exchange id>' or '<name>=<ticker url>' (a stub)"""
+    sources = []
+    for entry in (item.strip() for item in config.split(',')):
+        if not entry:
+            continue
+        if entry == 'coindcx':
+            sources.append(CoinDCXSource(coindcx_url, coindcx_public_url, timeout=timeout))
+        elif entry.startswith('ccxt:'):
+            sources.append(CCXTSource(entry[len('ccxt:'):], markets, timeout=timeout))
+        elif '=' in entry:
+            name, url = entry.split('=', 1)
+            sources.append(HTTPTickerSource(name.strip(), url.strip(), timeout=timeout))
+        else:
+            raise ValueError(f"Unknown price source: {entry}")
+    return sources
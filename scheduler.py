@@ -0,0 +1,143 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class TickStats:
+    """Run count and latency of one strategy's tick handler; percentiles come from the last ``samples`` runs"""
+
+    def __init__(self, samples=256):
+        self.runs = 0
+        self.skipped = 0  # ticks dropped because the previous one was still running
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last_run = None
+        self.recent = deque(maxlen=samples)
+
+    def record(self, elapsed, finished, error=False):
+        self.runs += 1
+        self.errors += error
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+        self.last_run = finished
+        self.recent.append(elapsed)
+
+    def to_dict(self):
+        recent = sorted(self.recent)
+        return {
+            'runs': self.runs,
+            'skipped': self.skipped,
+            'errors': self.errors,
+            'mean_ms': round(self.total / self.runs * 1000, 3) if self.runs else None,
+            'p50_ms': round(_percentile(recent, 0.5) * 1000, 3) if recent else None,
+            'p99_ms': round(_percentile(recent, 0.99) * 1000, 3) if recent else None,
+            'max_ms': round(self.max * 1000, 3),
+            'last_run': self.last_run
+        }
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+class StrategyScheduler:
+    """Runs strategy tick handlers for every ticker snapshot on a bounded worker pool.
+
+    Each owner (an account) schedules one handler per market it is active in,
+    and a snapshot is only dispatched to the handlers of markets it has a
+    price for. A handler whose previous tick is still running skips the new
+    one instead of queueing behind it, so a slow strategy can't build a
+    backlog or hold up the others.
+    """
+
+    def __init__(self, max_workers=8, samples=256):
+        self.max_workers = max_workers
+        self.samples = samples
+        self._handlers = {}  # market -> {owner: handler(price)}
+        self._stats = {}  # (owner, market) -> TickStats
+        self._busy = set()  # (owner, market) with a tick queued or running
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='strategy')
+
+    def schedule(self, owner, handlers):
+        """Make ``handlers`` ({market: handler(price)}) the owner's complete set, replacing earlier ones"""
+        with self._lock:
+            for market, by_owner in list(self._handlers.items()):
+                if market not in handlers and owner in by_owner:
+                    del by_owner[owner]
+                    self._stats.pop((owner, market), None)
+                    if not by_owner:
+                        del self._handlers[market]
+            for market, handler in handlers.items():
+                self._handlers.setdefault(market, {})[owner] = handler
+                self._stats.setdefault((owner, market), TickStats(self.samples))
+
+    def on_ticker(self, snapshot):
+        with self._lock:
+            work = []
+            for market, by_owner in self._handlers.items():
+                ticker = snapshot.get(market)
+                if not ticker:
+                    continue
+                try:
+                    price = float(ticker['last_price'])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                for owner, handler in by_owner.items():
+                    key = (owner, market)
+                    if key in self._busy:
+                        self._stats[key].skipped += 1
+                        continue
+                    self._busy.add(key)
+                    work.append((key, handler, price))
+        for key, handler, price in work:
+            self._executor.submit(self._run, key, handler, price)
+
+    def _run(self, key, handler, price):
+        started = time.perf_counter()
+        error = False
+        try:
+            handler(price)
+        except Exception as e:
+            error = True
+            logger.error(f"Error in strategy {key[0]} {key[1]}: {str(e)}")
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._busy.discard(key)
+                if not self._busy:
+                    self._idle.notify_all()
+                stats = self._stats.get(key)
+                if stats is not None:
+                    stats.record(elapsed, time.time(), error)
+
+    def wait_idle(self, timeout=None):
+        """Block until no tick is queued or running; False if ``timeout`` passed first"""
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._busy, timeout)
+
+    def stats(self, owner=None):
+        """Per-strategy stats, for one owner or all of them"""
+        with self._lock:
+            return [dict(stats.to_dict(), owner=key[0], market=key[1])
+                    for key, stats in self._stats.items() if owner is None or key[0] == owner]
+
+    def summary(self):
+        with self._lock:
+            recent = sorted(elapsed for stats in self._stats.values() for elapsed in stats.recent)
+            return {
+                'strategies': len(self._stats),
+                'markets': len(self._handlers),
+                'workers': self.max_workers,
+                'busy': len(self._busy),
+                'runs': sum(stats.runs for stats in self._stats.values()),
+                'skipped': sum(stats.skipped for stats in self._stats.values()),
+                'p50_ms': round(_percentile(recent, 0.5) * 1000, 3) if recent else None,
+                'p99_ms': round(_percentile(recent, 0.99) * 1000, 3) if recent else None
+            }
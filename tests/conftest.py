@@ -0,0 +1,44 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# app starts its ticker thread on import: point it at nothing and keep its files out of the repository
+_workdir = tempfile.mkdtemp(prefix='gridbot-tests-')
+os.environ.update({
+    'COINDCX_BASE_URL': 'http://127.0.0.1:9',
+    'PRICE_SOURCES': 'coindcx',
+    'TICKER_REFRESH_INTERVAL': '3600',
+    'ACCOUNT_STATE_PATH': os.path.join(_workdir, 'anonymous.json'),
+    'ACCOUNTS_DIR': os.path.join(_workdir, 'accounts')
+})
+os.environ.setdefault('SUPABASE_URL', 'http://127.0.0.1:9')
+os.environ.setdefault('SUPABASE_KEY', 'eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.tests')
+
+
+@pytest.fixture
+def app_module():
+    import app
+    return app
+
+
+@pytest.fixture
+def account(app_module, tmp_path):
+    account = app_module.VirtualAccount(state_path=tmp_path / 'account.json')
+    yield account
+    account.close()
+
+
+@pytest.fixture
+def depth(app_module, monkeypatch):
+    """Fill against a fixed order book, as with FILL_MODEL=depth: ``depth({'asks': [(price, quantity)]})``"""
+    from fill_model import DepthCache
+
+    def use(book):
+        monkeypatch.setattr(app_module, 'depth_cache', DepthCache(lambda market: book))
+    return use
@@ -0,0 +1,27 @@
+from ledger import Order
+from order_book import OrderBook
+
+
+def order(order_id, side, price):
+    return Order(order_id, 'OMUSDT', side, 'limit', price, 1, 'OPEN', None)
+
+
+def test_crossed_is_best_price_first_and_fifo_within_a_price():
+    book = OrderBook('OMUSDT')
+    for order_id, price in (('b1', 100), ('b2', 101), ('b3', 100), ('b4', 101), ('b5', 99)):
+        book.add(order(order_id, 'buy', price))
+    for order_id, price in (('a1', 103), ('a2', 102), ('a3', 103), ('a4', 102)):
+        book.add(order(order_id, 'sell', price))
+
+    assert book.crossed(100) == ['b2', 'b4', 'b1', 'b3']
+    assert book.crossed(103) == ['a2', 'a4', 'a1', 'a3']
+
+
+def test_removed_orders_are_not_crossed():
+    book = OrderBook('OMUSDT')
+    for order_id in ('b1', 'b2', 'b3'):
+        book.add(order(order_id, 'buy', 100))
+    assert book.remove('b2')
+    assert not book.remove('b2')
+    assert book.crossed(100) == ['b1', 'b3']
+    assert len(book) == 2
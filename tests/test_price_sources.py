@@ -0,0 +1,88 @@
+import time
+
+import pytest
+
+from price_sources import PriceAggregator, PriceSource
+
+
+class StubSource(PriceSource):
+    """Serves fixed tickers, or raises ``error``, counting the fetches"""
+
+    def __init__(self, name, tickers=None, error=None, **options):
+        super().__init__(name, **options)
+        self.tickers = tickers or {}
+        self.error = error
+        self.calls = 0
+
+    def fetch(self):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return {market: dict(ticker, market=market) for market, ticker in self.tickers.items()}
+
+
+def source(name, price, bid=None, ask=None, volume=None):
+    return StubSource(name, {'OMUSDT': {'last_price': str(price), 'bid': bid, 'ask': ask, 'volume': volume}})
+
+
+def price(aggregator):
+    snapshot, _ = aggregator.fetch()
+    return float(snapshot['OMUSDT']['last_price'])
+
+
+def test_median():
+    aggregator = PriceAggregator([source('a', 10), source('b', 11), source('c', 20)])
+    assert price(aggregator) == 11
+
+
+def test_vwap():
+    aggregator = PriceAggregator([source('a', 10, volume=3), source('b', 20, volume=1)], method='vwap')
+    assert price(aggregator) == pytest.approx(12.5)
+
+
+def test_vwap_without_volumes_falls_back_to_median():
+    aggregator = PriceAggregator([source('a', 10, volume=3), source('b', 20), source('c', 30)], method='vwap')
+    assert price(aggregator) == 20
+
+
+def test_best_uses_highest_bid_and_lowest_ask():
+    aggregator = PriceAggregator([source('a', 10, bid='9.9', ask='10.2'), source('b', 10, bid='10.0', ask='10.4')],
+                                 method='best')
+    assert price(aggregator) == pytest.approx(10.1)
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        PriceAggregator([], method='mean')
+
+
+def test_results_older_than_max_age_are_dropped():
+    aggregator = PriceAggregator([source('a', 10), source('b', 12)], max_age=5.0)
+    snapshot, fetched_at = aggregator.fetch()
+    assert snapshot['OMUSDT']['sources'] == 2
+    assert aggregator._combine(fetched_at + 4)[0]['OMUSDT']['last_price'] == 11
+    assert aggregator._combine(fetched_at + 6) == (None, None)
+
+
+def test_failing_source_backs_off():
+    broken = StubSource('broken', error=ConnectionError('down'), max_backoff=4)
+    aggregator = PriceAggregator([source('ok', 10), broken], grace=0)
+    assert price(aggregator) == 10
+    # The round returns on the first answer; the failure is recorded when the broken fetch finishes
+    deadline = time.time() + 2
+    while not broken.failures and time.time() < deadline:
+        time.sleep(0.01)
+    assert broken.calls == 1 and broken.failures == 1
+
+    # Skipped until its retry time, while the healthy source keeps the price coming
+    aggregator.fetch()
+    assert broken.calls == 1
+    assert aggregator.status()[1]['healthy'] is False
+
+    now = time.time()
+    for failures in range(2, 6):
+        broken.record_failure(ConnectionError('down'), now)
+        assert broken.retry_at - now == min(2 ** (failures - 1), 4)
+
+    broken.record_success(0.1)
+    assert broken.healthy(time.time())
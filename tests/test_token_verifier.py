@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+from token_verifier import InvalidToken, TokenVerifier, _b64encode, mint_token
+
+SECRET = 'test-secret'
+
+
+def with_algorithm(token, alg):
+    header = _b64encode(json.dumps({'alg': alg, 'typ': 'JWT'}).encode())
+    return '.'.join([header] + token.split('.')[1:])
+
+
+class Remote:
+    """Stands in for Supabase's get_user, counting the calls that reach it"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, token):
+        self.calls += 1
+        return f"remote-{self.calls}"
+
+
+def test_valid_token():
+    assert TokenVerifier(SECRET).verify(mint_token(SECRET, 'user-1')) == 'user-1'
+
+
+def test_expired_token_within_leeway():
+    verifier = TokenVerifier(SECRET, leeway=30)
+    assert verifier.verify(mint_token(SECRET, 'user-1', expires_in=-10)) == 'user-1'
+    with pytest.raises(InvalidToken, match='expired'):
+        verifier.verify(mint_token(SECRET, 'user-1', expires_in=-31))
+
+
+def test_bad_signature():
+    with pytest.raises(InvalidToken, match='signature'):
+        TokenVerifier(SECRET).verify(mint_token('other-secret', 'user-1'))
+
+
+def test_wrong_algorithm_is_not_sent_remotely():
+    remote = Remote()
+    verifier = TokenVerifier(SECRET, remote=remote)
+    with pytest.raises(InvalidToken, match='algorithm'):
+        verifier.verify(with_algorithm(mint_token(SECRET, 'user-1'), 'RS256'))
+    with pytest.raises(InvalidToken, match='algorithm'):
+        verifier.verify(with_algorithm(mint_token(SECRET, 'user-1'), 'none'))
+    assert remote.calls == 0
+
+
+def test_cache_hit_skips_remote():
+    remote = Remote()
+    verifier = TokenVerifier(remote=remote)
+    token = mint_token(SECRET, 'user-1')
+    assert verifier.verify(token) == 'remote-1'
+    assert verifier.verify(token) == 'remote-1'
+    assert remote.calls == 1
+
+
+def test_least_recently_used_token_is_evicted():
+    remote = Remote()
+    verifier = TokenVerifier(remote=remote, cache_size=2)
+    first, second, third = (mint_token(SECRET, f"user-{i}") for i in range(3))
+    verifier.verify(first)
+    verifier.verify(second)
+    verifier.verify(first)  # now second is the least recently used
+    verifier.verify(third)
+    assert remote.calls == 3
+
+    verifier.verify(first)
+    assert remote.calls == 3
+    verifier.verify(second)
+    assert remote.calls == 4
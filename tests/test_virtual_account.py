@@ -0,0 +1,82 @@
+def test_partly_filled_market_order_expires(account, depth):
+    depth({'asks': [(10, 2)], 'bids': []})
+    order = account.get_order(account.place_order('OMUSDT', 'buy', 10, 10, 'market')['id'])
+    assert order['status'] == 'EXPIRED'
+    assert order['filled_quantity'] == 2
+    assert account.get_balances()['USDT'] == 980
+    assert account.get_balances()['OM'] == 2
+
+    result = account.cancel_order(order['id'])
+    assert result['code'] == 400
+    assert account.get_balances()['USDT'] == 980
+
+
+def test_rejected_batch_leaves_depth_untaken(account, depth):
+    depth({'asks': [(10, 2)], 'bids': []})
+    result = account.place_orders([
+        {'market': 'OMUSDT', 'side': 'buy', 'type': 'market', 'price': 10, 'quantity': 2},
+        {'market': 'OMUSDT', 'side': 'sell', 'type': 'market', 'price': 10, 'quantity': 100}
+    ])
+    assert 'error' in result
+
+    order = account.get_order(account.place_order('OMUSDT', 'buy', 10, 2, 'market')['id'])
+    assert order['status'] == 'FILLED'
+    assert account.get_balances()['OM'] == 2
+
+
+def test_unrealized_pnl_counts_base_held_by_resting_sells(account):
+    account.place_order('OMUSDT', 'buy', 10, 10, 'market')
+    account.place_order('OMUSDT', 'sell', 12, 10, 'limit')
+    assert account.get_balances()['OM'] == 0
+
+    pnl = account.calculate_pnl('OMUSDT', 11)
+    assert pnl['unrealized_pnl'] == 10
+    assert pnl['realized_pnl'] == 0
+
+
+def test_reset_starts_positions_over(app_module, account, tmp_path):
+    account.place_order('OMUSDT', 'buy', 10, 10, 'market')
+    account.reset_all()
+    assert account.calculate_pnl('OMUSDT', 12)['unrealized_pnl'] == 0
+
+    account.place_order('OMUSDT', 'buy', 5, 1, 'market')
+    account.place_order('OMUSDT', 'sell', 6, 1, 'market')
+    assert account.calculate_pnl('OMUSDT', 12)['realized_pnl'] == 1
+
+    # The journal and a compacted snapshot rebuild the same positions
+    replayed = app_module.VirtualAccount(state_path=tmp_path / 'account.json')
+    assert replayed.positions == account.positions
+    replayed.journal.compact(replayed._state_copy(), background=False)
+    replayed.close()
+    restored = app_module.VirtualAccount(state_path=tmp_path / 'account.json')
+    assert restored.positions == account.positions
+    assert restored.calculate_pnl('OMUSDT', 12)['realized_pnl'] == 1
+    restored.close()
+
+
+def test_state_capture_is_not_changed_by_later_commits(account):
+    order = account.place_order('OMUSDT', 'buy', 5, 1, 'limit')
+    build = account._state_capture()
+    account.cancel_order(order['id'])
+    account.place_order('OMUSDT', 'buy', 10, 1, 'market')
+
+    state = build()
+    assert [o['status'] for o in state['orders']] == ['OPEN']
+    assert state['trades'] == []
+    assert state['balances']['USDT'] == 995
+
+
+def test_background_compaction_restores_the_same_account(app_module, account, tmp_path):
+    account.journal.compact_every = 5
+    for _ in range(10):
+        account.place_order('OMUSDT', 'buy', 10, 1, 'market')
+        order = account.place_order('OMUSDT', 'sell', 12, 1, 'limit')
+        account.cancel_order(order['id'])
+    balances, positions = account.get_balances(), account.positions
+    orders = [o.to_dict() for o in account.orders]
+    account.close()  # waits for the last compaction
+    restored = app_module.VirtualAccount(state_path=tmp_path / 'account.json')
+    assert restored.get_balances() == balances
+    assert restored.positions == positions
+    assert [o.to_dict() for o in restored.orders] == orders
+    restored.close()